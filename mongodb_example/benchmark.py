@@ -0,0 +1,149 @@
+from beanie import init_beanie
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+import schema
+from schema import LPSModel, SectionCodec, SECTION_BUCKET_NAME, bulk_upsert_lps, get_lps, get_lps_projection, set_section_codec
+import typing as t
+import statistics
+import argparse
+import asyncio
+import random
+import bson
+import time
+import os
+
+
+# Section text layouts to compare. Spilling needs GridFS, so it is only benchmarked against a real MongoDB.
+SECTION_LAYOUTS = {
+    "plain": SectionCodec(),
+    "compressed": SectionCodec(compress_min_bytes=256),
+    "compressed_spill": SectionCodec(compress_min_bytes=256, spill_bytes=16 * 1024),
+}
+
+# Vocabulary of the generated section text, so it compresses roughly like generated prose rather than random bytes
+WORDS = (
+    "the study participants will receive drug placebo daily weeks visit doctor blood test side effects may include "
+    "headache nausea you can leave at any time trial researchers want to learn whether treatment helps people with "
+    "disease symptoms safety dose group randomly assigned questionnaire hospital clinic results information"
+).split()
+
+
+def generate_lps(rng: random.Random, count: int, sections: int, section_words: int) -> t.List[LPSModel]:
+    """Build count LPS documents with sections of about section_words words of generated text each."""
+    return [
+        LPSModel(
+            ctp_id=f"ctp_{i}",
+            lps_content={
+                f"section_{j}": " ".join(rng.choice(WORDS) for _ in range(rng.randint(section_words // 2, section_words * 3 // 2)))
+                for j in range(sections)
+            },
+            llm_judge_rating=rng.uniform(1, 5),
+            llm_judge_scores={f"section_{j}": rng.uniform(1, 5) for j in range(sections)},
+        )
+        for i in range(count)
+    ]
+
+
+async def _storage_size(database, collection) -> dict:
+    """BSON bytes of a collection's documents and of the GridFS chunks of spilled sections, plus collStats on a real server."""
+    sizes = {
+        "document_bytes": sum([len(bson.encode(document)) async for document in collection.find({})]),
+        "gridfs_bytes": sum([len(chunk["data"]) async for chunk in database[f"{SECTION_BUCKET_NAME}.chunks"].find({})]),
+    }
+    try:
+        stats = await database.command("collStats", collection.name)
+        sizes["storage_bytes"] = stats["storageSize"]
+    except Exception:
+        sizes["storage_bytes"] = None
+    return sizes
+
+
+def _latency_summary(latencies: t.List[float]) -> dict:
+    """Mean and p50/p95/p99 latency in milliseconds of a list of call durations in seconds."""
+    milliseconds = [latency * 1000 for latency in latencies]
+    percentiles = statistics.quantiles(milliseconds, n=100, method="inclusive")
+    return {
+        "reads": len(latencies),
+        "mean_ms": statistics.fmean(milliseconds),
+        "p50_ms": percentiles[49],
+        "p95_ms": percentiles[94],
+        "p99_ms": percentiles[98],
+    }
+
+
+async def benchmark_section_storage(documents: int = 1000, sections: int = 8, section_words: int = 1000, reads: int = 200,
+                                    database_uri: t.Optional[str] = None, layouts: t.Optional[t.Iterable[str]] = None,
+                                    seed: int = 0) -> t.List[dict]:
+    """
+    Write the same LPS documents under each section layout, then report the stored size and the latency of reading
+    whole documents with get_lps and one section with get_lps_projection. Runs against a throwaway database on
+    database_uri, or on mongomock when it is None.
+    """
+    if layouts is None:
+        layouts = [name for name, codec in SECTION_LAYOUTS.items() if database_uri or codec.spill_bytes is None]
+    previous_codec = schema.SECTION_CODEC
+    results = []
+    try:
+        for layout in layouts:
+            rng = random.Random(seed)
+            client = AsyncIOMotorClient(database_uri) if database_uri else AsyncMongoMockClient()
+            database = client[f"section_benchmark_{layout}"]
+            try:
+                await client.drop_database(database.name)
+                await init_beanie(database=database, document_models=[LPSModel])
+                set_section_codec(SECTION_LAYOUTS[layout])
+                lps = generate_lps(rng, documents, sections, section_words)
+                started = time.perf_counter()
+                if database_uri:
+                    await bulk_upsert_lps(lps, batch_size=100)
+                else:
+                    # mongomock cannot run ReplaceOne bulk writes, insert one by one instead
+                    for document in lps:
+                        await schema.create_lps(document)
+                write_seconds = time.perf_counter() - started
+                ctp_ids = [rng.choice(lps).ctp_id for _ in range(reads)]
+                whole, section = [], []
+                for ctp_id in ctp_ids:
+                    started = time.perf_counter()
+                    await get_lps(ctp_id)
+                    whole.append(time.perf_counter() - started)
+                    started = time.perf_counter()
+                    await get_lps_projection(ctp_id, sections=["section_0"])
+                    section.append(time.perf_counter() - started)
+                results.append({
+                    "layout": layout,
+                    "documents": documents,
+                    "write_seconds": write_seconds,
+                    **await _storage_size(database, LPSModel.get_motor_collection()),
+                    "get_lps": _latency_summary(whole),
+                    "get_lps_projection": _latency_summary(section),
+                })
+            finally:
+                await client.drop_database(database.name)
+                client.close()
+    finally:
+        set_section_codec(previous_codec)
+    return results
+
+
+# Example usage
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the storage size and read latency of LPS section layouts.")
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--section-words", type=int, default=1000)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--layouts", nargs="+", choices=list(SECTION_LAYOUTS), default=None)
+    parser.add_argument("--database-uri", default=os.getenv("MONGO_BENCHMARK_URI"),
+                        help="MongoDB to create throwaway databases on, mongomock when unset. Defaults to MONGO_BENCHMARK_URI")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark_section_storage(
+        args.documents, args.sections, args.section_words, args.reads, args.database_uri, args.layouts
+    ))
+    for result in results:
+        storage = f"{result['storage_bytes']:>12,}" if result["storage_bytes"] is not None else f"{'n/a':>12}"
+        print(f"{result['layout']:<17} documents {result['document_bytes']:>12,}B  gridfs {result['gridfs_bytes']:>12,}B  "
+              f"storage {storage}B  write {result['write_seconds']:.2f}s  "
+              f"get_lps p50 {result['get_lps']['p50_ms']:.2f}ms p99 {result['get_lps']['p99_ms']:.2f}ms  "
+              f"section p50 {result['get_lps_projection']['p50_ms']:.2f}ms p99 {result['get_lps_projection']['p99_ms']:.2f}ms")
@@ -1,9 +1,16 @@
 import asyncio
+import itertools
 import typing as t
+import zlib
+import os
 import motor.motor_asyncio
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import AfterValidator, BaseModel, BeforeValidator, EmailStr, Field
 from beanie import init_beanie, Document
-from bson import ObjectId
+from beanie.odm.utils.dump import get_dict
+from bson import Binary, ObjectId
+from gridfs.errors import NoFile
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 from datetime import datetime
 
 
@@ -19,7 +26,135 @@ collection = db[COLLECTION_NAME]
 
 
 async def init():
-    await init_beanie(database=db, document_models=[CTPModel, LPSModel, BSModel])
+    """
+    Bind the models to the database and create the indexes declared in their Settings. Collections written before
+    the natural keys had unique indexes are deduplicated first with dedupe_natural_keys, or the indexes would fail
+    to build.
+    """
+    document_models = [PromptModel, CTPModel, LPSModel, BSModel]
+    await init_beanie(database=db, document_models=document_models, skip_indexes=True)
+    await dedupe_natural_keys()
+    await init_beanie(database=db, document_models=document_models)
+
+
+# Section text storage
+
+# Binary subtypes of stored section text: zlib-compressed UTF-8, or the ObjectId of a GridFS file holding it
+COMPRESSED_SECTION_SUBTYPE = 128
+SPILLED_SECTION_SUBTYPE = 129
+SECTION_BUCKET_NAME = "section_text"
+
+
+class SectionCodec(t.NamedTuple):
+    """
+    How LPS and BS section text is written. Sections of at least compress_min_bytes UTF-8 bytes are stored as
+    zlib-compressed binary, and sections still larger than spill_bytes are moved to GridFS. None turns either off.
+    Compressed and spilled sections are always read back, and their files are deleted whenever they are rewritten
+    or removed, whatever the codec.
+    """
+    compress_min_bytes: t.Optional[int] = None
+    level: int = 6
+    spill_bytes: t.Optional[int] = None
+
+
+def _optional_int(value: t.Optional[str]) -> t.Optional[int]:
+    return int(value) if value else None
+
+
+SECTION_CODEC = SectionCodec(
+    compress_min_bytes=_optional_int(os.getenv("MONGO_SECTION_COMPRESS_MIN_BYTES")),
+    spill_bytes=_optional_int(os.getenv("MONGO_SECTION_SPILL_BYTES")),
+)
+
+
+def set_section_codec(codec: SectionCodec):
+    """Change how section text is written from now on. Stored sections keep their layout until they are rewritten."""
+    global SECTION_CODEC
+    SECTION_CODEC = codec
+
+
+class SectionText(str):
+    """Section text of a model. Its type is what tells the Beanie encoder to compress it on the way to Mongo."""
+
+
+def _encode_section(text: str):
+    """Stored form of section text: zlib-compressed binary when compression is enabled and saves space, else text."""
+    codec = SECTION_CODEC
+    raw = text.encode()
+    if codec.compress_min_bytes is not None and len(raw) >= codec.compress_min_bytes:
+        compressed = zlib.compress(raw, codec.level)
+        if len(compressed) < len(raw):
+            return Binary(compressed, COMPRESSED_SECTION_SUBTYPE)
+    return str(text)
+
+
+def _decode_section(value):
+    """Section text from its stored form. Spilled sections have to be loaded with _load_sections first."""
+    if isinstance(value, Binary):
+        if value.subtype == COMPRESSED_SECTION_SUBTYPE:
+            return zlib.decompress(value).decode()
+        if value.subtype == SPILLED_SECTION_SUBTYPE:
+            raise ValueError("Section text is stored in GridFS, read it with get_lps, get_bs or the projection reads")
+    return value
+
+
+# Sections and their text, decompressed when validated and compressed by the Beanie encoder
+SectionContent = t.Dict[str, t.Annotated[str, BeforeValidator(_decode_section), AfterValidator(SectionText)]]
+
+
+def _section_bucket(model):
+    """GridFS bucket for the spilled sections of a model's documents, in the model's database."""
+    return motor.motor_asyncio.AsyncIOMotorGridFSBucket(model.get_motor_collection().database, bucket_name=SECTION_BUCKET_NAME)
+
+
+def _is_spilled(value) -> bool:
+    return isinstance(value, Binary) and value.subtype == SPILLED_SECTION_SUBTYPE
+
+
+async def _spill_sections(model, ctp_id: str, encoded: dict) -> dict:
+    """Move stored sections larger than spill_bytes to GridFS, compressed, leaving a reference in their place."""
+    codec = SECTION_CODEC
+    if codec.spill_bytes is None:
+        return encoded
+    spilled = dict(encoded)
+    for section, value in encoded.items():
+        size = len(value) if isinstance(value, bytes) else len(value.encode())
+        if size <= codec.spill_bytes:
+            continue
+        data = bytes(value) if isinstance(value, Binary) else zlib.compress(value.encode(), codec.level)
+        file_id = await _section_bucket(model).upload_from_stream(
+            f"{ctp_id}/{section}", data,
+            metadata={"collection": model.get_motor_collection().name, "ctp_id": ctp_id, "section": section},
+        )
+        spilled[section] = Binary(file_id.binary, SPILLED_SECTION_SUBTYPE)
+    return spilled
+
+
+async def _store_sections(model, ctp_id: str, content: dict) -> dict:
+    """Stored form of section text under the current codec, uploading sections that spill to GridFS."""
+    return await _spill_sections(model, ctp_id, {section: _encode_section(text) for section, text in content.items()})
+
+
+async def _load_sections(model, content: t.Optional[dict]) -> t.Optional[dict]:
+    """Replace the references to spilled sections in stored content with their compressed text from GridFS."""
+    if not content:
+        return content
+    loaded = dict(content)
+    for section, value in content.items():
+        if _is_spilled(value):
+            stream = await _section_bucket(model).open_download_stream(ObjectId(bytes(value)))
+            loaded[section] = Binary(await stream.read(), COMPRESSED_SECTION_SUBTYPE)
+    return loaded
+
+
+async def _delete_spilled_files(model, values: t.Iterable):
+    """Delete the GridFS files referenced by spilled section values. Files another writer already deleted are skipped."""
+    for value in values:
+        if _is_spilled(value):
+            try:
+                await _section_bucket(model).delete(ObjectId(bytes(value)))
+            except NoFile:
+                pass
 
 
 # Models and Pydantic schemas
@@ -34,6 +169,10 @@ class PromptModel(Document):
 
     class Settings:
         collection = "prompts"
+        indexes = [
+            IndexModel([("prompt_id", ASCENDING)], name="prompt_id_unique", unique=True),
+            IndexModel([("prompt_type", ASCENDING), ("last_updated", DESCENDING)], name="prompt_type_last_updated"),
+        ]
 
     class Config:
         json_encoders = {ObjectId: str}
@@ -52,6 +191,7 @@ class CTPModel(Document):
 
     class Settings:
         collection = "ctps"
+        indexes = [IndexModel([("cpt_id", ASCENDING)], name="cpt_id_unique", unique=True)]
 
     class Config:
         json_encoders = {ObjectId: str}
@@ -61,13 +201,15 @@ class CTPModel(Document):
 class LPSModel(Document):
     """Mongo ORM model for the LPS table."""
     ctp_id: str = Field(..., description="Unique identifier for the CTP")
-    lps_content: t.Dict[str, str] = Field(default={}, description="LPS sections and their text content")
+    lps_content: SectionContent = Field(default={}, description="LPS sections and their text content")
     llm_judge_rating: t.Optional[float] = Field(default=0.0, description="LLM judge composite rating for the LPS")
     llm_judge_scores: t.Optional[dict] = Field(default={}, description="LLM judge scores for each section and metric")
     last_updated: t.Optional[datetime] = Field(default_factory=datetime.utcnow, description="Timestamp of last update")
 
     class Settings:
         collection = "lps"
+        indexes = [IndexModel([("ctp_id", ASCENDING)], name="ctp_id_unique", unique=True)]
+        bson_encoders = {SectionText: _encode_section}
 
     class Config:
         json_encoders = {ObjectId: str}
@@ -77,22 +219,96 @@ class LPSModel(Document):
 class BSModel(Document):
     """Mongo ORM model for the BS table."""
     ctp_id: str = Field(..., description="Unique identifier for the CTP")
-    bs_content: t.Dict[str, str] = Field(default={}, description="BS sections and their text content")
+    bs_content: SectionContent = Field(default={}, description="BS sections and their text content")
     llm_judge_rating: t.Optional[float] = Field(default=0.0, description="LLM judge composite rating for the BS")
     llm_judge_scores: t.Optional[dict] = Field(default={}, description="LLM judge scores for each section and metric")
     last_updated: t.Optional[datetime] = Field(default_factory=datetime.utcnow, description="Timestamp of last update")
 
     class Settings:
         collection = "bs"
+        indexes = [IndexModel([("ctp_id", ASCENDING)], name="ctp_id_unique", unique=True)]
+        bson_encoders = {SectionText: _encode_section}
 
     class Config:
         json_encoders = {ObjectId: str}
         from_attributes = True
 
 
+class UpdateCounts(BaseModel):
+    """Pydantic model for the documents matched and modified by an update."""
+    matched_count: int
+    modified_count: int
+
+
+class LPSProjection(BaseModel):
+    """Pydantic model for the parts of an LPS read by get_lps_projection. Fields that were not read are left unset."""
+    ctp_id: str
+    lps_content: SectionContent = {}
+    llm_judge_rating: t.Optional[float] = None
+    llm_judge_scores: t.Optional[dict] = None
+    last_updated: t.Optional[datetime] = None
+
+
+class BSProjection(BaseModel):
+    """Pydantic model for the parts of a BS read by get_bs_projection. Fields that were not read are left unset."""
+    ctp_id: str
+    bs_content: SectionContent = {}
+    llm_judge_rating: t.Optional[float] = None
+    llm_judge_scores: t.Optional[dict] = None
+    last_updated: t.Optional[datetime] = None
+
+
+class BulkWriteSummary(BaseModel):
+    """Pydantic model for the outcome of one bulk_write batch."""
+    batch: int
+    documents: int
+    upserted_count: int
+    matched_count: int
+    modified_count: int
+    write_errors: t.List[dict] = []
+
+
 # CRUD operations
 
 
+async def _set_fields(model, query, fields: dict, unset: t.Iterable[str] = ()) -> UpdateCounts:
+    """
+    Set the given fields and last_updated on the document matching the query, and remove the unset fields, with
+    a single update_one, leaving every other field as stored.
+    """
+    result = await model.get_motor_collection().update_one(query, _field_update(fields, unset))
+    return UpdateCounts(matched_count=result.matched_count, modified_count=result.modified_count)
+
+
+def _field_update(fields: dict, unset: t.Iterable[str] = ()) -> dict:
+    """Update document that sets the given fields and last_updated and removes the unset fields."""
+    update = {"$set": {**fields, "last_updated": datetime.utcnow()}}
+    unset = list(unset)
+    if unset:
+        update["$unset"] = {field: "" for field in unset}
+    return update
+
+
+async def _set_sections(model, content_field: str, ctp_id: str, stored: dict, fields: dict, unset: t.Iterable[str] = (),
+                        paths: t.Iterable[str] = ()) -> UpdateCounts:
+    """
+    Set fields that rewrite stored sections like _set_fields, then delete the GridFS files of the sections the
+    update replaced or removed. The replaced values at paths are read by the same find_one_and_update, so a
+    concurrent writer's files are never mistaken for this call's. Without a matching document the files just
+    uploaded for stored are deleted instead.
+    """
+    previous = await model.get_motor_collection().find_one_and_update(
+        {"ctp_id": ctp_id}, _field_update(fields, unset),
+        projection={path: 1 for path in paths}, return_document=ReturnDocument.BEFORE,
+    )
+    if previous is None:
+        await _delete_spilled_files(model, stored.values())
+        return UpdateCounts(matched_count=0, modified_count=0)
+    await _delete_spilled_files(model, (previous.get(content_field) or {}).values())
+    # last_updated is always set, so a matched document is always modified
+    return UpdateCounts(matched_count=1, modified_count=1)
+
+
 async def create_ctp(new_ctp: CTPModel):
     await new_ctp.insert()
     return new_ctp.id
@@ -102,17 +318,13 @@ async def get_ctp(cpt_id: str):
     return await CTPModel.find_one(CTPModel.cpt_id == cpt_id)
 
 
-async def update_ctp(cpt_id: str, lps_id: int = None, bs_id: int = None, new_metadata: dict = None, new_categories: t.List[str] = None):
-    if lps_id is None and bs_id is None and new_metadata is None and new_categories is None:
+async def update_ctp(cpt_id: str, lps_id: int = None, bs_id: int = None, new_metadata: dict = None, new_categories: t.List[str] = None) -> UpdateCounts:
+    """Update only the given fields of a CTP in one round trip. Fields left as None keep their stored values."""
+    fields = {"lps_id": lps_id, "bs_id": bs_id, "ctp_metadata": new_metadata, "categories": new_categories}
+    fields = {name: value for name, value in fields.items() if value is not None}
+    if not fields:
         raise ValueError("At least one field must be updated")
-    ctp = await CTPModel.find_one(CTPModel.cpt_id == cpt_id)
-    if ctp:
-        ctp.lps_id = lps_id
-        ctp.bs_id = bs_id
-        ctp.ctp_metadata = new_metadata
-        ctp.categories = new_categories
-        ctp.last_updated = datetime.utcnow()
-        await ctp.save()
+    return await _set_fields(CTPModel, {"cpt_id": cpt_id}, fields)
 
 
 async def delete_ctp(cpt_id: int):
@@ -121,58 +333,330 @@ async def delete_ctp(cpt_id: int):
         await ctp.delete()
 
 
+async def _insert_with_sections(document: Document, content_field: str):
+    """
+    Insert an LPS or BS, first moving its sections that spill to GridFS when spilling is on. The uploaded files
+    are deleted again when the insert fails, such as on a duplicate ctp_id.
+    """
+    if SECTION_CODEC.spill_bytes is None:
+        await document.insert()
+        return
+    model = type(document)
+    stored = get_dict(document, to_db=True, exclude={"id"})
+    stored[content_field] = await _spill_sections(model, document.ctp_id, stored[content_field])
+    try:
+        document.id = (await model.get_motor_collection().insert_one(stored)).inserted_id
+    except Exception:
+        await _delete_spilled_files(model, stored[content_field].values())
+        raise
+
+
+async def _find_with_sections(model, content_field: str, ctp_id: str):
+    """Read the LPS or BS of a CTP, with its spilled sections loaded from GridFS."""
+    document = await model.get_motor_collection().find_one({"ctp_id": ctp_id})
+    if document is None:
+        return None
+    if content_field in document:
+        document[content_field] = await _load_sections(model, document[content_field])
+    return model.model_validate(document)
+
+
+async def _update_content(model, content_field: str, ctp_id: str, new_content: t.Optional[dict],
+                          new_judge_rating: t.Optional[float], new_judge_scores: t.Optional[dict]) -> UpdateCounts:
+    """Update only the given fields of an LPS or BS in one round trip, storing new content through the codec."""
+    fields = {"llm_judge_rating": new_judge_rating, "llm_judge_scores": new_judge_scores}
+    fields = {name: value for name, value in fields.items() if value is not None}
+    if new_content is None and not fields:
+        raise ValueError("At least one field must be updated")
+    if new_content is None:
+        return await _set_fields(model, {"ctp_id": ctp_id}, fields)
+    stored = await _store_sections(model, ctp_id, new_content)
+    return await _set_sections(model, content_field, ctp_id, stored, {content_field: stored, **fields}, paths=[content_field])
+
+
+async def _delete_with_sections(model, content_field: str, ctp_id: str):
+    """Delete the LPS or BS of a CTP and the GridFS files of its spilled sections."""
+    previous = await model.get_motor_collection().find_one_and_delete({"ctp_id": ctp_id}, projection={content_field: 1})
+    if previous is not None:
+        await _delete_spilled_files(model, (previous.get(content_field) or {}).values())
+
+
+def _check_section_name(section: str):
+    """Reject section names that Mongo would read as a nested path or an operator."""
+    if not section or "." in section or section.startswith("$"):
+        raise ValueError(f"Invalid section name: {section!r}")
+
+
+async def _update_sections(model, content_field: str, ctp_id: str, changed_sections: t.Optional[dict],
+                           removed_sections: t.Optional[t.Iterable[str]], new_judge_scores: t.Optional[dict],
+                           new_judge_rating: t.Optional[float]) -> UpdateCounts:
+    """
+    Set and unset single sections of the content of a CTP's document, and the judge scores of the same sections,
+    in one update. Removed sections lose their judge scores too.
+    """
+    changed_sections = changed_sections or {}
+    removed_sections = list(removed_sections or [])
+    new_judge_scores = new_judge_scores or {}
+    for section in itertools.chain(changed_sections, removed_sections, new_judge_scores):
+        _check_section_name(section)
+    conflicting = set(removed_sections) & (set(changed_sections) | set(new_judge_scores))
+    if conflicting:
+        raise ValueError(f"Sections both changed and removed: {sorted(conflicting)}")
+    if not changed_sections and not removed_sections and not new_judge_scores and new_judge_rating is None:
+        raise ValueError("At least one section or score must be updated")
+    stored = await _store_sections(model, ctp_id, changed_sections)
+    fields = {f"{content_field}.{section}": value for section, value in stored.items()}
+    fields.update({f"llm_judge_scores.{section}": score for section, score in new_judge_scores.items()})
+    if new_judge_rating is not None:
+        fields["llm_judge_rating"] = new_judge_rating
+    unset = [f"{prefix}.{section}" for section in removed_sections for prefix in (content_field, "llm_judge_scores")]
+    if not changed_sections and not removed_sections:
+        return await _set_fields(model, {"ctp_id": ctp_id}, fields, unset)
+    paths = [f"{content_field}.{section}" for section in itertools.chain(changed_sections, removed_sections)]
+    return await _set_sections(model, content_field, ctp_id, stored, fields, unset, paths)
+
+
+async def _sync_sections(model, projection_model, content_field: str, ctp_id: str, new_content: dict,
+                         new_judge_scores: t.Optional[dict], new_judge_rating: t.Optional[float]) -> UpdateCounts:
+    """
+    Diff new content and judge scores against the stored ones and write only the sections that differ, removing
+    stored sections missing from new_content. Skips the write when nothing changed.
+    """
+    stored = await _get_projection(model, projection_model, content_field, ctp_id, None, [content_field, "llm_judge_scores"])
+    if stored is None:
+        return UpdateCounts(matched_count=0, modified_count=0)
+    stored_content = getattr(stored, content_field)
+    stored_scores = stored.llm_judge_scores or {}
+    changed_sections = {section: text for section, text in new_content.items() if stored_content.get(section, None) != text}
+    removed_sections = [section for section in stored_content if section not in new_content]
+    changed_scores = {
+        section: score for section, score in (new_judge_scores or {}).items()
+        if section in new_content and stored_scores.get(section, None) != score
+    }
+    if not changed_sections and not removed_sections and not changed_scores and new_judge_rating is None:
+        return UpdateCounts(matched_count=1, modified_count=0)
+    return await _update_sections(model, content_field, ctp_id, changed_sections, removed_sections, changed_scores, new_judge_rating)
+
+
+async def _get_projection(model, projection_model, content_field: str, ctp_id: str,
+                          sections: t.Optional[t.List[str]], fields: t.Optional[t.List[str]]):
+    """
+    Read only the given content sections and top-level fields of the document of a CTP, with a Mongo projection,
+    into a projection model. Returns None when there is no document.
+    """
+    allowed = set(projection_model.model_fields) - {"ctp_id"}
+    unknown = set(fields or []) - allowed
+    if unknown:
+        raise ValueError(f"Unknown fields: {sorted(unknown)}")
+    for section in sections or []:
+        _check_section_name(section)
+    projection = {"_id": 0, "ctp_id": 1}
+    projection.update({field: 1 for field in fields or []})
+    if content_field not in projection:
+        projection.update({f"{content_field}.{section}": 1 for section in sections or []})
+    document = await model.get_motor_collection().find_one({"ctp_id": ctp_id}, projection)
+    if document is None:
+        return None
+    if content_field in document:
+        document[content_field] = await _load_sections(model, document[content_field])
+    return projection_model.model_validate(document)
+
+
+async def get_lps_projection(ctp_id: str, sections: t.List[str] = None, fields: t.List[str] = None) -> t.Optional[LPSProjection]:
+    """
+    Read the given lps_content sections and LPSProjection fields of the LPS of a CTP, without transferring or
+    validating the rest of the document. For example fields=["llm_judge_scores"] reads only the judge scores.
+    """
+    return await _get_projection(LPSModel, LPSProjection, "lps_content", ctp_id, sections, fields)
+
+
 async def create_lps(new_lps: LPSModel):
-    await new_lps.insert()
+    await _insert_with_sections(new_lps, "lps_content")
     return new_lps.id
 
 
 async def get_lps(ctp_id: str):
-    return await LPSModel.find_one(LPSModel.ctp_id == ctp_id)
+    return await _find_with_sections(LPSModel, "lps_content", ctp_id)
 
 
-async def update_lps(ctp_id: str, new_content: dict = None, new_judge_rating: float = None, new_judge_scores: dict = None):
-    if new_content is None and new_judge_rating is None and new_judge_scores is None:
-        raise ValueError("At least one field must be updated")
-    lps = await LPSModel.find_one(LPSModel.ctp_id == ctp_id)
-    if lps:
-        lps.lps_content = new_content
-        lps.llm_judge_rating = new_judge_rating
-        lps.llm_judge_scores = new_judge_scores
-        lps.last_updated = datetime.utcnow()
-        await lps.save()
+async def update_lps(ctp_id: str, new_content: dict = None, new_judge_rating: float = None, new_judge_scores: dict = None) -> UpdateCounts:
+    """Update only the given fields of an LPS in one round trip. Fields left as None keep their stored values."""
+    return await _update_content(LPSModel, "lps_content", ctp_id, new_content, new_judge_rating, new_judge_scores)
+
+
+async def update_lps_sections(ctp_id: str, changed_sections: dict = None, removed_sections: t.List[str] = None,
+                              new_judge_scores: dict = None, new_judge_rating: float = None) -> UpdateCounts:
+    """
+    Set only the given sections of an LPS and their judge scores, and remove the removed sections with their
+    scores, in one round trip. Sections not mentioned keep their stored text and scores.
+    """
+    return await _update_sections(LPSModel, "lps_content", ctp_id, changed_sections, removed_sections, new_judge_scores, new_judge_rating)
+
+
+async def sync_lps_sections(ctp_id: str, new_content: dict, new_judge_scores: dict = None, new_judge_rating: float = None) -> UpdateCounts:
+    """
+    Make the content of an LPS equal to new_content, writing only the sections and judge scores that differ from
+    the stored ones. Costs one projected read of the content and scores, plus one update when anything changed.
+    """
+    return await _sync_sections(LPSModel, LPSProjection, "lps_content", ctp_id, new_content, new_judge_scores, new_judge_rating)
 
 
 async def delete_lps(ctp_id: str):
-    lps = await LPSModel.find_one(LPSModel.ctp_id == ctp_id)
-    if lps:
-        await lps.delete()
+    await _delete_with_sections(LPSModel, "lps_content", ctp_id)
+
+
+async def get_bs_projection(ctp_id: str, sections: t.List[str] = None, fields: t.List[str] = None) -> t.Optional[BSProjection]:
+    """
+    Read the given bs_content sections and BSProjection fields of the BS of a CTP, without transferring or
+    validating the rest of the document. For example fields=["llm_judge_scores"] reads only the judge scores.
+    """
+    return await _get_projection(BSModel, BSProjection, "bs_content", ctp_id, sections, fields)
 
 
 async def create_bs(new_bs: BSModel):
-    await new_bs.insert()
+    await _insert_with_sections(new_bs, "bs_content")
     return new_bs.id
 
 
 async def get_bs(ctp_id: str):
-    return await BSModel.find_one(BSModel.ctp_id == ctp_id)
+    return await _find_with_sections(BSModel, "bs_content", ctp_id)
 
 
-async def update_bs(ctp_id: str, new_content: dict = None, new_judge_rating: float = None, new_judge_scores: dict = None):
-    if new_content is None and new_judge_rating is None and new_judge_scores is None:
-        raise ValueError("At least one field must be updated")
-    bs = await BSModel.find_one(BSModel.ctp_id == ctp_id)
-    if bs:
-        bs.bs_content = new_content
-        bs.llm_judge_rating = new_judge_rating
-        bs.llm_judge_scores = new_judge_scores
-        bs.last_updated = datetime.utcnow()
-        await bs.save()
+async def update_bs(ctp_id: str, new_content: dict = None, new_judge_rating: float = None, new_judge_scores: dict = None) -> UpdateCounts:
+    """Update only the given fields of a BS in one round trip. Fields left as None keep their stored values."""
+    return await _update_content(BSModel, "bs_content", ctp_id, new_content, new_judge_rating, new_judge_scores)
+
+
+async def update_bs_sections(ctp_id: str, changed_sections: dict = None, removed_sections: t.List[str] = None,
+                             new_judge_scores: dict = None, new_judge_rating: float = None) -> UpdateCounts:
+    """
+    Set only the given sections of a BS and their judge scores, and remove the removed sections with their
+    scores, in one round trip. Sections not mentioned keep their stored text and scores.
+    """
+    return await _update_sections(BSModel, "bs_content", ctp_id, changed_sections, removed_sections, new_judge_scores, new_judge_rating)
+
+
+async def sync_bs_sections(ctp_id: str, new_content: dict, new_judge_scores: dict = None, new_judge_rating: float = None) -> UpdateCounts:
+    """
+    Make the content of a BS equal to new_content, writing only the sections and judge scores that differ from
+    the stored ones. Costs one projected read of the content and scores, plus one update when anything changed.
+    """
+    return await _sync_sections(BSModel, BSProjection, "bs_content", ctp_id, new_content, new_judge_scores, new_judge_rating)
 
 
 async def delete_bs(ctp_id: str):
-    bs = await BSModel.find_one(BSModel.ctp_id == ctp_id)
-    if bs:
-        await bs.delete()
+    await _delete_with_sections(BSModel, "bs_content", ctp_id)
+
+
+# Bulk operations
+
+
+def _batches(documents: t.Iterable, batch_size: int):
+    """Split an iterable into lists of at most batch_size items, without materializing it."""
+    iterator = iter(documents)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+async def _bulk_upsert(model, key: str, documents: t.Iterable[Document], batch_size: int,
+                       content_field: t.Optional[str] = None) -> t.List[BulkWriteSummary]:
+    """
+    Replace the stored document with the same natural key as each given document, or insert it, batch_size
+    documents per unordered bulk_write. A failed write does not stop the rest of its batch or later batches, it is
+    reported in the batch's summary. Sections of content_field that spill are moved to GridFS first, and the
+    files of the sections that were replaced are deleted after the write.
+    """
+    collection = model.get_motor_collection()
+    summaries = []
+    for number, batch in enumerate(_batches(documents, batch_size)):
+        # Keep the last document of each key, two upserts of one key in an unordered batch can both try to insert
+        latest = {getattr(document, key): document for document in batch}
+        replacements = [get_dict(document, to_db=True, exclude={"id"}) for document in latest.values()]
+        if content_field is not None:
+            # The stored sections the replacements overwrite, read before the write as bulk writes return no documents
+            previous = {
+                document[key]: document.get(content_field) or {}
+                async for document in collection.find({key: {"$in": list(latest)}}, {key: 1, content_field: 1})
+            }
+            if SECTION_CODEC.spill_bytes is not None:
+                for value, replacement in zip(latest, replacements):
+                    replacement[content_field] = await _spill_sections(model, value, replacement[content_field])
+        operations = [
+            ReplaceOne({key: value}, replacement, upsert=True)
+            for value, replacement in zip(latest, replacements)
+        ]
+        try:
+            result = (await collection.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as error:
+            result = error.details
+        if content_field is not None:
+            # A failed replacement leaves the stored document and its spilled files as they were, so only the
+            # files just uploaded for it are dropped
+            failed = {error["index"] for error in result.get("writeErrors", [])}
+            for index, value in enumerate(latest):
+                if index in failed:
+                    await _delete_spilled_files(model, replacements[index][content_field].values())
+                else:
+                    await _delete_spilled_files(model, previous.get(value, {}).values())
+        summaries.append(BulkWriteSummary(
+            batch=number,
+            documents=len(operations),
+            upserted_count=result["nUpserted"],
+            matched_count=result["nMatched"],
+            modified_count=result["nModified"],
+            write_errors=[
+                {"index": error["index"], "code": error["code"], "errmsg": error["errmsg"]}
+                for error in result.get("writeErrors", [])
+            ],
+        ))
+    return summaries
+
+
+async def bulk_upsert_ctps(ctps: t.Iterable[CTPModel], batch_size: int = 1000) -> t.List[BulkWriteSummary]:
+    """Insert or replace many CTPs by cpt_id, batch_size per round trip, and return a summary of each batch."""
+    return await _bulk_upsert(CTPModel, "cpt_id", ctps, batch_size)
+
+
+async def bulk_upsert_lps(lps: t.Iterable[LPSModel], batch_size: int = 1000) -> t.List[BulkWriteSummary]:
+    """Insert or replace many LPS by ctp_id, batch_size per round trip, and return a summary of each batch."""
+    return await _bulk_upsert(LPSModel, "ctp_id", lps, batch_size, "lps_content")
+
+
+async def bulk_upsert_bs(bs: t.Iterable[BSModel], batch_size: int = 1000) -> t.List[BulkWriteSummary]:
+    """Insert or replace many BS by ctp_id, batch_size per round trip, and return a summary of each batch."""
+    return await _bulk_upsert(BSModel, "ctp_id", bs, batch_size, "bs_content")
+
+
+# Migrations
+
+
+async def dedupe_natural_keys() -> t.Dict[str, int]:
+    """
+    Delete the documents that share their prompt_id, cpt_id or ctp_id with a more recently updated document, along
+    with the GridFS files of their spilled sections, and return the number deleted per collection. Collections that
+    already have the unique index on their natural key cannot hold duplicates and are skipped.
+    """
+    deleted = {}
+    for model, key, content_field in [(PromptModel, "prompt_id", None), (CTPModel, "cpt_id", None),
+                                      (LPSModel, "ctp_id", "lps_content"), (BSModel, "ctp_id", "bs_content")]:
+        collection = model.get_motor_collection()
+        if f"{key}_unique" in await collection.index_information():
+            continue
+        duplicates = collection.aggregate([
+            {"$sort": {"last_updated": DESCENDING, "_id": DESCENDING}},
+            {"$group": {"_id": f"${key}", "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}},
+        ], allowDiskUse=True)
+        # Keep the most recently updated document of each key, like a bulk upsert keeps the last one given
+        stale_ids = [stale_id async for group in duplicates for stale_id in group["ids"][1:]]
+        deleted[collection.name] = len(stale_ids)
+        if not stale_ids:
+            continue
+        if content_field is not None:
+            async for document in collection.find({"_id": {"$in": stale_ids}}, {content_field: 1}):
+                await _delete_spilled_files(model, document.get(content_field, {}).values())
+        await collection.delete_many({"_id": {"$in": stale_ids}})
+    return deleted
 
 
 # Example usage
@@ -1,11 +1,30 @@
 import pytest
 import asyncio
 import unittest
+import os
+from unittest import mock
 from beanie import init_beanie
 from mongomock_motor import AsyncMongoMockClient
 from datetime import datetime
 
-from schema import CTPModel, LPSModel, BSModel, PromptModel
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import BulkWriteResult
+from bson import Binary, ObjectId
+from gridfs.errors import NoFile
+import schema
+import benchmark
+from schema import (
+    CTPModel, LPSModel, BSModel, PromptModel, UpdateCounts, BulkWriteSummary, LPSProjection, BSProjection,
+    update_ctp, update_lps, update_bs, get_ctp, get_lps, get_lps_projection, get_bs_projection,
+    update_lps_sections, update_bs_sections, sync_lps_sections, sync_bs_sections,
+    create_lps, create_bs, get_bs, delete_lps, delete_bs, SectionCodec, set_section_codec,
+    COMPRESSED_SECTION_SUBTYPE, SPILLED_SECTION_SUBTYPE,
+    bulk_upsert_ctps, bulk_upsert_lps, bulk_upsert_bs,
+)
+
+# A real MongoDB for the tests that need the query planner, such as mongodb://localhost:27017. Skipped when unset.
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI")
 
 
 @pytest.mark.asyncio
@@ -212,3 +231,497 @@ class TestBSModel(unittest.TestCase):
         # Verify deletion
         deleted_bs = await BSModel.find_one(BSModel.ctp_id == "ctp123")
         assert deleted_bs is None
+
+
+class TestPartialUpdates(unittest.IsolatedAsyncioTestCase):
+    """Tests for the update functions, which set only the fields they are given."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db = self.client["test_database"]
+        await init_beanie(database=self.db, document_models=[CTPModel, LPSModel, BSModel])
+        await CTPModel(cpt_id="ctp123", apollo_index_id="index123", ctp_metadata={"key": "value"}, categories=["category1"]).insert()
+        for model, content in [(LPSModel, "lps_content"), (BSModel, "bs_content")]:
+            await model(ctp_id="ctp123", llm_judge_rating=4.5, llm_judge_scores={"section1": 4.0}, **{content: {"section1": "text"}}).insert()
+
+    async def test_update_ctp_keeps_fields_not_given(self):
+        counts = await update_ctp("ctp123", lps_id=1)
+        assert counts == UpdateCounts(matched_count=1, modified_count=1)
+        ctp = await CTPModel.find_one(CTPModel.cpt_id == "ctp123")
+        assert (ctp.lps_id, ctp.bs_id, ctp.ctp_metadata, ctp.categories) == (1, None, {"key": "value"}, ["category1"])
+        assert await update_ctp("missing", bs_id=2) == UpdateCounts(matched_count=0, modified_count=0)
+        with self.assertRaises(ValueError):
+            await update_ctp("ctp123")
+
+    async def test_update_lps_and_bs_keep_fields_not_given(self):
+        assert (await update_lps("ctp123", new_judge_rating=3.0)).matched_count == 1
+        lps = await LPSModel.find_one(LPSModel.ctp_id == "ctp123")
+        assert (lps.lps_content, lps.llm_judge_rating, lps.llm_judge_scores) == ({"section1": "text"}, 3.0, {"section1": 4.0})
+        assert (await update_bs("ctp123", new_content={"section1": "new text"})).modified_count == 1
+        bs = await BSModel.find_one(BSModel.ctp_id == "ctp123")
+        assert (bs.bs_content, bs.llm_judge_rating) == ({"section1": "new text"}, 4.5)
+
+
+class TestProjections(unittest.IsolatedAsyncioTestCase):
+    """Tests for the projection reads, which return only the sections and fields asked for."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db = self.client["test_database"]
+        await init_beanie(database=self.db, document_models=[LPSModel, BSModel])
+        scores = {"section1": 4.0, "section2": 3.0}
+        await LPSModel(ctp_id="ctp123", lps_content={"section1": "one", "section2": "two"}, llm_judge_rating=4.5, llm_judge_scores=scores).insert()
+        await BSModel(ctp_id="ctp123", bs_content={"section1": "one", "section2": "two"}, llm_judge_rating=4.5, llm_judge_scores=scores).insert()
+
+    async def test_sections_only(self):
+        lps = await get_lps_projection("ctp123", sections=["section2", "missing"])
+        assert lps == LPSProjection(ctp_id="ctp123", lps_content={"section2": "two"})
+        bs = await get_bs_projection("ctp123", sections=["section1"])
+        assert bs == BSProjection(ctp_id="ctp123", bs_content={"section1": "one"})
+
+    async def test_fields_only(self):
+        lps = await get_lps_projection("ctp123", fields=["llm_judge_scores"])
+        assert (lps.lps_content, lps.llm_judge_rating, lps.llm_judge_scores) == ({}, None, {"section1": 4.0, "section2": 3.0})
+        lps = await get_lps_projection("ctp123", sections=["section1"], fields=["lps_content", "llm_judge_rating"])
+        assert (lps.lps_content, lps.llm_judge_rating) == ({"section1": "one", "section2": "two"}, 4.5)
+
+    async def test_missing_document_and_invalid_names(self):
+        assert await get_bs_projection("missing", sections=["section1"]) is None
+        with self.assertRaises(ValueError):
+            await get_lps_projection("ctp123", fields=["_id"])
+        with self.assertRaises(ValueError):
+            await get_bs_projection("ctp123", sections=["section1.text"])
+
+
+class TestSectionUpdates(unittest.IsolatedAsyncioTestCase):
+    """Tests for the section-level updates, which write only the sections and judge scores that change."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db = self.client["test_database"]
+        await init_beanie(database=self.db, document_models=[LPSModel, BSModel])
+        scores = {"section1": 4.0, "section2": 3.0}
+        await LPSModel(ctp_id="ctp123", lps_content={"section1": "one", "section2": "two"}, llm_judge_rating=4.5, llm_judge_scores=scores).insert()
+        await BSModel(ctp_id="ctp123", bs_content={"section1": "one", "section2": "two"}, llm_judge_rating=4.5, llm_judge_scores=scores).insert()
+
+    async def test_update_sections_sets_and_unsets_paths(self):
+        with mock.patch.object(schema, "_field_update", wraps=schema._field_update) as field_update:
+            counts = await update_lps_sections("ctp123", changed_sections={"section3": "three"}, removed_sections=["section2"], new_judge_scores={"section3": 5.0})
+        assert counts == UpdateCounts(matched_count=1, modified_count=1)
+        fields, unset = field_update.call_args.args
+        assert fields == {"lps_content.section3": "three", "llm_judge_scores.section3": 5.0}
+        assert unset == ["lps_content.section2", "llm_judge_scores.section2"]
+        lps = await LPSModel.find_one(LPSModel.ctp_id == "ctp123")
+        assert lps.lps_content == {"section1": "one", "section3": "three"}
+        assert (lps.llm_judge_rating, lps.llm_judge_scores) == (4.5, {"section1": 4.0, "section3": 5.0})
+
+    async def test_update_sections_rejects_empty_and_conflicting_updates(self):
+        with self.assertRaises(ValueError):
+            await update_bs_sections("ctp123")
+        with self.assertRaises(ValueError):
+            await update_bs_sections("ctp123", changed_sections={"section1": "new"}, removed_sections=["section1"])
+        with self.assertRaises(ValueError):
+            await update_bs_sections("ctp123", changed_sections={"section1.text": "new"})
+
+    async def test_sync_writes_only_the_difference(self):
+        with mock.patch.object(schema, "_field_update", wraps=schema._field_update) as field_update:
+            counts = await sync_bs_sections("ctp123", {"section1": "one", "section3": "three"}, new_judge_scores={"section1": 4.0, "section3": 2.0})
+        assert counts.modified_count == 1
+        fields, unset = field_update.call_args.args
+        assert fields == {"bs_content.section3": "three", "llm_judge_scores.section3": 2.0}
+        assert unset == ["bs_content.section2", "llm_judge_scores.section2"]
+        bs = await BSModel.find_one(BSModel.ctp_id == "ctp123")
+        assert (bs.bs_content, bs.llm_judge_scores) == ({"section1": "one", "section3": "three"}, {"section1": 4.0, "section3": 2.0})
+
+    async def test_sync_skips_unchanged_and_missing_documents(self):
+        with mock.patch.object(schema, "_field_update", wraps=schema._field_update) as field_update:
+            assert await sync_lps_sections("ctp123", {"section1": "one", "section2": "two"}) == UpdateCounts(matched_count=1, modified_count=0)
+            assert await sync_lps_sections("missing", {"section1": "one"}) == UpdateCounts(matched_count=0, modified_count=0)
+        field_update.assert_not_called()
+
+
+class TestIndexes(unittest.IsolatedAsyncioTestCase):
+    """Tests for the indexes declared in the model Settings."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db = self.client["test_database"]
+        await init_beanie(database=self.db, document_models=[PromptModel, CTPModel, LPSModel, BSModel])
+
+    async def test_init_creates_indexes(self):
+        expected = {
+            PromptModel: {"prompt_id_unique": [("prompt_id", 1)], "prompt_type_last_updated": [("prompt_type", 1), ("last_updated", -1)]},
+            CTPModel: {"cpt_id_unique": [("cpt_id", 1)]},
+            LPSModel: {"ctp_id_unique": [("ctp_id", 1)]},
+            BSModel: {"ctp_id_unique": [("ctp_id", 1)]},
+        }
+        for model, indexes in expected.items():
+            information = await model.get_motor_collection().index_information()
+            for name, keys in indexes.items():
+                assert list(information[name]["key"]) == keys
+
+    async def test_natural_keys_are_unique(self):
+        await LPSModel(ctp_id="ctp123").insert()
+        with self.assertRaises(DuplicateKeyError):
+            await LPSModel(ctp_id="ctp123").insert()
+
+
+@pytest.mark.asyncio
+class TestDedupeNaturalKeys(unittest.IsolatedAsyncioTestCase):
+    """Tests for init on collections written before the natural keys had unique indexes."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db = self.client["test_database"]
+        self.bucket = MemoryBucket()
+        patcher = mock.patch.object(schema, "_section_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_init_keeps_the_latest_document_of_each_key(self):
+        # Write duplicates like the create functions did before the unique indexes
+        await init_beanie(database=self.db, document_models=[PromptModel, LPSModel], skip_indexes=True)
+        lps, prompts = LPSModel.get_motor_collection(), PromptModel.get_motor_collection()
+        stale_file = await self.bucket.upload_from_stream("section1", b"old", {"collection": lps.name, "ctp_id": "ctp123", "section": "section1"})
+        await lps.insert_many([
+            {"ctp_id": "ctp123", "lps_content": {"section1": Binary(stale_file.binary, SPILLED_SECTION_SUBTYPE)}, "last_updated": datetime(2024, 1, 1)},
+            {"ctp_id": "ctp123", "lps_content": {"section1": "new"}, "last_updated": datetime(2024, 1, 2)},
+            {"ctp_id": "ctp456", "lps_content": {"section1": "only"}, "last_updated": datetime(2024, 1, 1)},
+        ])
+        await prompts.insert_many([
+            {"prompt_id": "p1", "prompt_text": text, "prompt_type": "LPS", "last_updated": datetime(2024, 1, day)}
+            for day, text in [(2, "newer"), (1, "older")]
+        ])
+        with mock.patch.object(schema, "db", self.db):
+            await schema.init()
+        assert [document["prompt_text"] async for document in prompts.find({})] == ["newer"]
+        assert (await get_lps("ctp123")).lps_content == {"section1": "new"}
+        assert (await get_lps("ctp456")).lps_content == {"section1": "only"}
+        assert self.bucket.files == {}
+        assert "ctp_id_unique" in await lps.index_information()
+        with mock.patch.object(schema, "db", self.db):
+            await schema.init()
+        assert await schema.dedupe_natural_keys() == {}
+
+
+@unittest.skipUnless(MONGO_TEST_URI, "MONGO_TEST_URI is not set")
+class TestIndexScans(unittest.IsolatedAsyncioTestCase):
+    """Checks against a real MongoDB that the CRUD lookups are answered from an index rather than a collection scan."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncIOMotorClient(MONGO_TEST_URI)
+        self.db = self.client["test_indexes"]
+        await init_beanie(database=self.db, document_models=[PromptModel, CTPModel, LPSModel, BSModel])
+
+    async def asyncTearDown(self):
+        await self.client.drop_database("test_indexes")
+        self.client.close()
+
+    async def winning_stages(self, model, query):
+        explanation = await model.get_motor_collection().find(query).explain()
+        stages, plan = [], explanation["queryPlanner"]["winningPlan"]
+        while plan:
+            stages.append(plan.get("stage"))
+            plan = plan.get("inputStage") or plan.get("queryPlan")
+        return stages
+
+    async def test_lookups_use_index_scans(self):
+        await CTPModel(cpt_id="ctp123", apollo_index_id="index123", ctp_metadata={}).insert()
+        await LPSModel(ctp_id="ctp123").insert()
+        await BSModel(ctp_id="ctp123").insert()
+        assert (await get_ctp("ctp123")).cpt_id == "ctp123"
+        lookups = [
+            (CTPModel, {"cpt_id": "ctp123"}), (LPSModel, {"ctp_id": "ctp123"}), (BSModel, {"ctp_id": "ctp123"}),
+            (PromptModel, {"prompt_id": "p1"}), (PromptModel, {"prompt_type": "LPS"}),
+        ]
+        for model, query in lookups:
+            stages = await self.winning_stages(model, query)
+            assert "COLLSCAN" not in stages and any(stage in ("IXSCAN", "EXPRESS_IXSCAN") for stage in stages), (model, stages)
+
+
+class RecordingCollection:
+    """
+    Records bulk_write calls and reports every operation as an upsert. mongomock cannot run ReplaceOne bulk writes
+    with this version of pymongo, so the bulk functions are checked against this instead.
+    """
+
+    def __init__(self, fail_first: bool = False):
+        self.calls = []
+        self.fail_first = fail_first
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls.append((operations, ordered))
+        result = {"nInserted": 0, "nUpserted": len(operations), "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [], "writeErrors": []}
+        if self.fail_first:
+            result["nUpserted"] -= 1
+            result["writeErrors"] = [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key error", "op": {}}]
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    async def find(self, query, projection=None):
+        """Nothing is stored, so the bulk functions find no sections to replace."""
+        for document in ():
+            yield document
+
+
+class TestBulkUpsert(unittest.IsolatedAsyncioTestCase):
+    """Tests for the bulk upsert functions."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db = self.client["test_database"]
+        await init_beanie(database=self.db, document_models=[CTPModel, LPSModel, BSModel])
+
+    async def test_batches_are_unordered_upserts_on_the_natural_key(self):
+        documents = [LPSModel(ctp_id=f"ctp{i}", lps_content={"section1": f"text {i}"}) for i in range(5)]
+        collection = RecordingCollection()
+        with mock.patch.object(LPSModel, "get_motor_collection", return_value=collection):
+            summaries = await bulk_upsert_lps(iter(documents), batch_size=2)
+        assert [summary.documents for summary in summaries] == [2, 2, 1]
+        assert all(not ordered for _, ordered in collection.calls)
+        operation = collection.calls[0][0][0]
+        assert operation._filter == {"ctp_id": "ctp0"} and operation._upsert
+        assert operation._doc["lps_content"] == {"section1": "text 0"} and "_id" not in operation._doc
+
+    async def test_duplicate_keys_in_a_batch_keep_the_last_document(self):
+        documents = [BSModel(ctp_id="ctp1", llm_judge_rating=rating) for rating in [1.0, 2.0]]
+        collection = RecordingCollection()
+        with mock.patch.object(BSModel, "get_motor_collection", return_value=collection):
+            summaries = await bulk_upsert_bs(documents)
+        assert summaries == [BulkWriteSummary(batch=0, documents=1, upserted_count=1, matched_count=0, modified_count=0)]
+        assert collection.calls[0][0][0]._doc["llm_judge_rating"] == 2.0
+
+    async def test_write_errors_are_reported_per_batch(self):
+        documents = [CTPModel(cpt_id=f"ctp{i}", apollo_index_id="index", ctp_metadata={}) for i in range(3)]
+        with mock.patch.object(CTPModel, "get_motor_collection", return_value=RecordingCollection(fail_first=True)):
+            summaries = await bulk_upsert_ctps(documents, batch_size=3)
+        assert summaries[0].upserted_count == 2
+        assert summaries[0].write_errors == [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key error"}]
+
+
+@unittest.skipUnless(MONGO_TEST_URI, "MONGO_TEST_URI is not set")
+class TestBulkUpsertServer(unittest.IsolatedAsyncioTestCase):
+    """Bulk upserts against a real MongoDB."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncIOMotorClient(MONGO_TEST_URI)
+        self.db = self.client["test_bulk_upsert"]
+        await init_beanie(database=self.db, document_models=[CTPModel, LPSModel, BSModel])
+
+    async def asyncTearDown(self):
+        await self.client.drop_database("test_bulk_upsert")
+        self.client.close()
+
+    async def test_upsert_inserts_then_replaces(self):
+        first = await bulk_upsert_lps([LPSModel(ctp_id=f"ctp{i}", llm_judge_rating=1.0) for i in range(5)], batch_size=2)
+        assert sum(summary.upserted_count for summary in first) == 5
+        second = await bulk_upsert_lps([LPSModel(ctp_id=f"ctp{i}", llm_judge_rating=2.0) for i in range(3)])
+        assert (second[0].upserted_count, second[0].matched_count, second[0].modified_count) == (0, 3, 3)
+        assert (await get_lps("ctp0")).llm_judge_rating == 2.0
+        assert await LPSModel.find_all().count() == 5
+
+
+class MemoryBucket:
+    """
+    GridFS bucket kept in a dict, with the parts of the motor bucket API the spilled sections use. Motor refuses to
+    build a bucket on a mongomock database, so the spill tests patch this in.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    async def upload_from_stream(self, filename, data, metadata=None):
+        file_id = ObjectId()
+        self.files[file_id] = (bytes(data), metadata)
+        return file_id
+
+    async def open_download_stream(self, file_id):
+        return mock.Mock(read=mock.AsyncMock(return_value=self.files[file_id][0]))
+
+    async def delete(self, file_id):
+        if self.files.pop(file_id, None) is None:
+            raise NoFile(file_id)
+
+
+LONG_TEXT = "The participants take the study drug once a day for twelve weeks. " * 50
+
+
+class TestSectionCompression(unittest.IsolatedAsyncioTestCase):
+    """Tests for compressed section text, which models read and write as plain strings."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db = self.client["test_database"]
+        await init_beanie(database=self.db, document_models=[LPSModel, BSModel])
+        self.addCleanup(set_section_codec, schema.SECTION_CODEC)
+        set_section_codec(SectionCodec(compress_min_bytes=256))
+
+    async def stored_content(self, model, content_field):
+        return (await model.get_motor_collection().find_one({"ctp_id": "ctp123"}))[content_field]
+
+    async def test_long_sections_are_stored_compressed(self):
+        await create_lps(LPSModel(ctp_id="ctp123", lps_content={"long": LONG_TEXT, "short": "short text"}))
+        stored = await self.stored_content(LPSModel, "lps_content")
+        assert isinstance(stored["long"], Binary) and stored["long"].subtype == COMPRESSED_SECTION_SUBTYPE
+        assert len(stored["long"]) < len(LONG_TEXT) // 10 and stored["short"] == "short text"
+        assert (await get_lps("ctp123")).lps_content == {"long": LONG_TEXT, "short": "short text"}
+        assert (await LPSModel.find_one(LPSModel.ctp_id == "ctp123")).lps_content["long"] == LONG_TEXT
+        assert (await get_lps_projection("ctp123", sections=["long"])).lps_content == {"long": LONG_TEXT}
+
+    async def test_updates_compress_and_diff_decompressed_text(self):
+        await create_bs(BSModel(ctp_id="ctp123", bs_content={"section1": "short"}))
+        await update_bs("ctp123", new_content={"section1": LONG_TEXT})
+        assert (await self.stored_content(BSModel, "bs_content"))["section1"].subtype == COMPRESSED_SECTION_SUBTYPE
+        await update_bs_sections("ctp123", changed_sections={"section2": LONG_TEXT + "!"})
+        assert (await self.stored_content(BSModel, "bs_content"))["section2"].subtype == COMPRESSED_SECTION_SUBTYPE
+        counts = await sync_bs_sections("ctp123", {"section1": LONG_TEXT, "section2": LONG_TEXT + "!"})
+        assert counts == UpdateCounts(matched_count=1, modified_count=0)
+        assert (await get_bs("ctp123")).bs_content == {"section1": LONG_TEXT, "section2": LONG_TEXT + "!"}
+
+    async def test_bulk_upserts_compress(self):
+        documents = [LPSModel(ctp_id="ctp123", lps_content={"section1": LONG_TEXT})]
+        collection = RecordingCollection()
+        with mock.patch.object(LPSModel, "get_motor_collection", return_value=collection):
+            await bulk_upsert_lps(documents)
+        assert collection.calls[0][0][0]._doc["lps_content"]["section1"].subtype == COMPRESSED_SECTION_SUBTYPE
+
+    async def test_plain_sections_are_still_read_when_compression_is_off(self):
+        await create_lps(LPSModel(ctp_id="ctp123", lps_content={"section1": LONG_TEXT}))
+        set_section_codec(SectionCodec())
+        await update_lps_sections("ctp123", changed_sections={"section2": LONG_TEXT})
+        stored = await self.stored_content(LPSModel, "lps_content")
+        assert isinstance(stored["section1"], Binary) and stored["section2"] == LONG_TEXT
+        assert (await get_lps("ctp123")).lps_content == {"section1": LONG_TEXT, "section2": LONG_TEXT}
+
+
+class TestSectionSpill(unittest.IsolatedAsyncioTestCase):
+    """Tests for sections spilled to GridFS, against an in-memory bucket."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db = self.client["test_database"]
+        await init_beanie(database=self.db, document_models=[LPSModel, BSModel])
+        self.addCleanup(set_section_codec, schema.SECTION_CODEC)
+        set_section_codec(SectionCodec(spill_bytes=1000))
+        self.bucket = MemoryBucket()
+        patcher = mock.patch.object(schema, "_section_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def stored_content(self):
+        return (await LPSModel.get_motor_collection().find_one({"ctp_id": "ctp123"}))["lps_content"]
+
+    async def test_large_sections_spill_and_read_back(self):
+        await create_lps(LPSModel(ctp_id="ctp123", lps_content={"long": LONG_TEXT, "short": "short text"}))
+        stored = await self.stored_content()
+        assert stored["long"].subtype == SPILLED_SECTION_SUBTYPE and stored["short"] == "short text"
+        assert [metadata["section"] for _, metadata in self.bucket.files.values()] == ["long"]
+        assert (await get_lps("ctp123")).lps_content == {"long": LONG_TEXT, "short": "short text"}
+        assert (await get_lps_projection("ctp123", sections=["long"])).lps_content == {"long": LONG_TEXT}
+
+    async def test_replaced_and_deleted_sections_drop_their_files(self):
+        await create_lps(LPSModel(ctp_id="ctp123", lps_content={"section1": LONG_TEXT, "section2": LONG_TEXT}))
+        assert len(self.bucket.files) == 2
+        await update_lps_sections("ctp123", changed_sections={"section1": "short"})
+        assert [metadata["section"] for _, metadata in self.bucket.files.values()] == ["section2"]
+        await update_lps("ctp123", new_content={"section3": LONG_TEXT})
+        assert [metadata["section"] for _, metadata in self.bucket.files.values()] == ["section3"]
+        assert (await get_lps("ctp123")).lps_content == {"section3": LONG_TEXT}
+        await delete_lps("ctp123")
+        assert self.bucket.files == {} and await get_lps("ctp123") is None
+
+    async def test_failed_bulk_replacements_keep_the_stored_files(self):
+        await create_lps(LPSModel(ctp_id="c1", lps_content={"section1": LONG_TEXT}))
+        stored_files = set(self.bucket.files)
+        documents = [LPSModel(ctp_id=ctp_id, lps_content={"section1": LONG_TEXT + "!"}) for ctp_id in ["c1", "c2"]]
+        result = {"nInserted": 0, "nUpserted": 1, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+                  "writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key error", "op": {}}]}
+        with mock.patch.object(LPSModel.get_motor_collection(), "bulk_write", side_effect=BulkWriteError(result)):
+            summaries = await bulk_upsert_lps(documents)
+        assert summaries[0].write_errors[0]["index"] == 0
+        assert stored_files <= set(self.bucket.files)
+        assert sorted(metadata["ctp_id"] for _, metadata in self.bucket.files.values()) == ["c1", "c2"]
+        assert (await get_lps("c1")).lps_content == {"section1": LONG_TEXT}
+
+    async def test_updates_of_missing_documents_keep_no_files(self):
+        await update_lps("missing", new_content={"section1": LONG_TEXT})
+        await update_lps_sections("missing", changed_sections={"section1": LONG_TEXT})
+        assert self.bucket.files == {}
+
+    async def test_concurrent_updates_keep_the_stored_files(self):
+        await create_lps(LPSModel(ctp_id="ctp123", lps_content={"section1": LONG_TEXT}))
+        store_sections = schema._store_sections
+
+        async def store_then_let_another_writer_update(model, ctp_id, content):
+            stored = await store_sections(model, ctp_id, content)
+            if content == {"section1": LONG_TEXT + "A"}:
+                await update_lps("ctp123", new_content={"section1": LONG_TEXT + "B"})
+            return stored
+
+        with mock.patch.object(schema, "_store_sections", side_effect=store_then_let_another_writer_update):
+            await update_lps("ctp123", new_content={"section1": LONG_TEXT + "A"})
+        assert (await get_lps("ctp123")).lps_content == {"section1": LONG_TEXT + "A"}
+        assert len(self.bucket.files) == 1
+
+    async def test_files_are_deleted_after_spilling_is_turned_off(self):
+        await create_lps(LPSModel(ctp_id="c1", lps_content={"section1": LONG_TEXT, "section2": LONG_TEXT}))
+        await create_lps(LPSModel(ctp_id="c2", lps_content={"section1": LONG_TEXT}))
+        set_section_codec(SectionCodec())
+        await update_lps_sections("c1", removed_sections=["section2"])
+        await update_lps("c1", new_content={"section1": "short"})
+        await delete_lps("c2")
+        assert self.bucket.files == {}
+
+    async def test_failed_inserts_keep_no_files(self):
+        await create_lps(LPSModel(ctp_id="ctp123", lps_content={"section1": LONG_TEXT}))
+        stored_files = set(self.bucket.files)
+        with self.assertRaises(DuplicateKeyError):
+            await create_lps(LPSModel(ctp_id="ctp123", lps_content={"section1": LONG_TEXT + "!"}))
+        assert set(self.bucket.files) == stored_files
+
+    async def test_bulk_replacements_drop_the_replaced_files(self):
+        await create_lps(LPSModel(ctp_id="c1", lps_content={"section1": LONG_TEXT}))
+        replaced_files = set(self.bucket.files)
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 1, "nModified": 1, "nRemoved": 0, "upserted": [], "writeErrors": []}
+        with mock.patch.object(LPSModel.get_motor_collection(), "bulk_write", return_value=BulkWriteResult(result, True)):
+            await bulk_upsert_lps([LPSModel(ctp_id="c1", lps_content={"section1": LONG_TEXT + "!"})])
+        assert len(self.bucket.files) == 1 and not replaced_files & set(self.bucket.files)
+
+
+class TestSectionBenchmark(unittest.IsolatedAsyncioTestCase):
+    """Tests for the section storage benchmark, at a tiny scale on mongomock."""
+
+    async def test_benchmark_reports_every_layout_without_spilling(self):
+        previous_codec = schema.SECTION_CODEC
+        results = await benchmark.benchmark_section_storage(documents=5, sections=2, section_words=200, reads=3)
+        assert [result["layout"] for result in results] == ["plain", "compressed"]
+        plain, compressed = results
+        assert compressed["document_bytes"] < plain["document_bytes"] // 2
+        assert plain["get_lps"]["reads"] == compressed["get_lps_projection"]["reads"] == 3
+        assert schema.SECTION_CODEC is previous_codec
+
+
+@unittest.skipUnless(MONGO_TEST_URI, "MONGO_TEST_URI is not set")
+class TestSectionSpillServer(unittest.IsolatedAsyncioTestCase):
+    """Spilled sections against a real MongoDB and GridFS."""
+
+    async def asyncSetUp(self):
+        self.client = AsyncIOMotorClient(MONGO_TEST_URI)
+        self.db = self.client["test_section_spill"]
+        await init_beanie(database=self.db, document_models=[LPSModel, BSModel])
+        self.addCleanup(set_section_codec, schema.SECTION_CODEC)
+        set_section_codec(SectionCodec(compress_min_bytes=256, spill_bytes=100))
+
+    async def asyncTearDown(self):
+        await self.client.drop_database("test_section_spill")
+        self.client.close()
+
+    async def test_spill_round_trip(self):
+        await create_bs(BSModel(ctp_id="ctp123", bs_content={"section1": LONG_TEXT}))
+        await bulk_upsert_bs([BSModel(ctp_id="ctp456", bs_content={"section1": LONG_TEXT})])
+        assert (await get_bs("ctp123")).bs_content == {"section1": LONG_TEXT}
+        assert (await get_bs_projection("ctp456", sections=["section1"])).bs_content == {"section1": LONG_TEXT}
+        assert await self.db["section_text.files"].count_documents({}) == 2
+        await delete_bs("ctp123")
+        await update_bs("ctp456", new_content={"section1": "short"})
+        assert await self.db["section_text.files"].count_documents({}) == 0
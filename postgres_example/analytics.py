@@ -0,0 +1,179 @@
+from sqlalchemy import select, func, literal
+from pydantic import BaseModel
+from schema import LPS, BS, SessionLocal
+from export import flatten_judge_scores
+import numpy as np
+import typing as t
+
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class RatingSummary(BaseModel):
+    """Pydantic model for the distribution of llm_judge_rating over a document table."""
+    count: int
+    mean: t.Optional[float] = None
+    std: t.Optional[float] = None
+    min: t.Optional[float] = None
+    max: t.Optional[float] = None
+    percentiles: t.Dict[float, float] = {}
+    histogram_edges: t.List[float] = []
+    histogram_counts: t.List[int] = []
+
+
+class CTPRating(BaseModel):
+    """Pydantic model for a CTP and the rating of its best or worst rated document."""
+    ctp_id: int
+    document_id: int
+    llm_judge_rating: float
+
+
+def load_ratings(db_session, model=LPS, batch_size: int = 10_000) -> np.ndarray:
+    """Stream the non-null llm_judge_rating values of LPS or BS into a float array."""
+    result = db_session.execute(
+        select(model.llm_judge_rating).where(model.llm_judge_rating.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    try:
+        chunks = [
+            np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows))
+            for rows in result.partitions()
+        ]
+    finally:
+        result.close()
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float64)
+
+
+def _summarize_in_database(db_session, model, percentiles, bins: int) -> RatingSummary:
+    """Compute the rating summary with Postgres aggregates, so only the summary crosses the wire."""
+    rating = model.llm_judge_rating
+    count, mean, std, minimum, maximum, values = db_session.execute(
+        select(
+            func.count(rating),
+            func.avg(rating),
+            func.stddev_pop(rating),
+            func.min(rating),
+            func.max(rating),
+            func.percentile_cont(literal([p / 100 for p in percentiles])).within_group(rating),
+        )
+    ).one()
+    if not count:
+        return RatingSummary(count=0)
+    edges = np.linspace(minimum, maximum, bins + 1) if maximum > minimum else np.linspace(minimum - 0.5, maximum + 0.5, bins + 1)
+    # width_bucket puts the maximum in bucket bins + 1, numpy includes it in the last bin
+    bucket = func.least(func.width_bucket(rating, float(edges[0]), float(edges[-1]), bins), bins)
+    counts = np.zeros(bins, dtype=np.int64)
+    for index, bucket_count in db_session.execute(
+        select(bucket, func.count()).where(rating.isnot(None)).group_by(bucket)
+    ):
+        counts[index - 1] = bucket_count
+    return RatingSummary(
+        count=count,
+        mean=float(mean),
+        std=float(std),
+        min=minimum,
+        max=maximum,
+        percentiles=dict(zip(percentiles, values)),
+        histogram_edges=edges.tolist(),
+        histogram_counts=counts.tolist(),
+    )
+
+
+def rating_summary(db_session, model=LPS, percentiles: t.Sequence[float] = DEFAULT_PERCENTILES, bins: int = 10,
+                   batch_size: int = 10_000) -> RatingSummary:
+    """
+    Summarize the llm_judge_rating distribution of LPS or BS: count, mean, standard deviation, range,
+    percentiles and a histogram.
+
+    Aggregated by the database on Postgres. Elsewhere the ratings are streamed into a NumPy array.
+    """
+    if db_session.get_bind().dialect.name == "postgresql":
+        return _summarize_in_database(db_session, model, percentiles, bins)
+    ratings = load_ratings(db_session, model, batch_size)
+    if not ratings.size:
+        return RatingSummary(count=0)
+    counts, edges = np.histogram(ratings, bins=bins)
+    return RatingSummary(
+        count=ratings.size,
+        mean=float(ratings.mean()),
+        std=float(ratings.std()),
+        min=float(ratings.min()),
+        max=float(ratings.max()),
+        percentiles=dict(zip(percentiles, np.percentile(ratings, percentiles).tolist())),
+        histogram_edges=edges.tolist(),
+        histogram_counts=counts.tolist(),
+    )
+
+
+def metric_means(db_session, model=LPS, batch_size: int = 10_000) -> t.Dict[str, float]:
+    """
+    Mean of every judge score across LPS or BS, keyed by "<section>.<metric>".
+
+    The scores are streamed batch_size rows at a time into a NaN-padded matrix with one column per metric, and
+    summed column-wise, so a document missing a metric does not count towards its mean.
+    """
+    columns: t.Dict[str, int] = {}
+    sums = np.zeros(0, dtype=np.float64)
+    counts = np.zeros(0, dtype=np.int64)
+    result = db_session.execute(select(model.llm_judge_scores).execution_options(yield_per=batch_size))
+    try:
+        for rows in result.partitions():
+            flattened = [flatten_judge_scores(row[0], prefix="") for row in rows]
+            for scores in flattened:
+                for name in scores:
+                    columns.setdefault(name, len(columns))
+            matrix = np.full((len(flattened), len(columns)), np.nan)
+            for row, scores in enumerate(flattened):
+                for name, value in scores.items():
+                    matrix[row, columns[name]] = value
+            sums = np.pad(sums, (0, len(columns) - sums.size))
+            counts = np.pad(counts, (0, len(columns) - counts.size))
+            sums += np.nansum(matrix, axis=0)
+            counts += np.count_nonzero(~np.isnan(matrix), axis=0)
+    finally:
+        result.close()
+    means = np.divide(sums, counts, out=np.full(sums.size, np.nan), where=counts > 0)
+    return {name: float(means[index]) for name, index in columns.items()}
+
+
+def _ctps_by_rating(db_session, model, n: int, worst: bool, batch_size: int) -> t.List[CTPRating]:
+    """Walk the llm_judge_rating index in order and stop as soon as n distinct CTPs have been seen."""
+    if n <= 0:
+        return []
+    order = (model.llm_judge_rating.asc(), model.id.asc()) if worst else (model.llm_judge_rating.desc(), model.id.asc())
+    result = db_session.execute(
+        select(model.ctp_id, model.id, model.llm_judge_rating)
+        .where(model.llm_judge_rating.isnot(None))
+        .order_by(*order)
+        .execution_options(yield_per=batch_size)
+    )
+    ctps: t.Dict[int, CTPRating] = {}
+    try:
+        for ctp_id, document_id, rating in result:
+            if ctp_id not in ctps:
+                ctps[ctp_id] = CTPRating(ctp_id=ctp_id, document_id=document_id, llm_judge_rating=rating)
+                if len(ctps) == n:
+                    break
+    finally:
+        result.close()
+    return list(ctps.values())
+
+
+def worst_ctps(db_session, model=LPS, n: int = 10, batch_size: int = 1000) -> t.List[CTPRating]:
+    """The n CTPs whose lowest rated LPS or BS scores worst, lowest first."""
+    return _ctps_by_rating(db_session, model, n, worst=True, batch_size=batch_size)
+
+
+def best_ctps(db_session, model=LPS, n: int = 10, batch_size: int = 1000) -> t.List[CTPRating]:
+    """The n CTPs whose highest rated LPS or BS scores best, highest first."""
+    return _ctps_by_rating(db_session, model, n, worst=False, batch_size=batch_size)
+
+
+# Example usage
+if __name__ == "__main__":
+    db = SessionLocal()
+    for document_model in [LPS, BS]:
+        print(document_model.__tablename__, rating_summary(db, document_model))
+        print(document_model.__tablename__, metric_means(db, document_model))
+        print(document_model.__tablename__, worst_ctps(db, document_model, n=5))
+    db.close()
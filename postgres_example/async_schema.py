@@ -0,0 +1,231 @@
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import UnboundExecutionError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+import schema
+from schema import Base, DATABASE_URL, User, CTPs, LPS, BS, LayGlossary, _engine_options
+import functools
+
+
+# Async drivers for the sync drivers of DATABASE_URL
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_url(url: str) -> str:
+    """Swap the driver of a database URL for its async counterpart: asyncpg for Postgres and aiosqlite for SQLite."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for database backend: {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def build_async_engine(url: str, **overrides):
+    """Create an async engine for a sync or async database URL, with the same pool settings as build_engine."""
+    url = async_url(url)
+    return create_async_engine(url, **_engine_options(url, **overrides))
+
+
+@functools.lru_cache(maxsize=None)
+def get_async_engine():
+    """Return the async engine for DATABASE_URL, building it on first use rather than at import time."""
+    return build_async_engine(DATABASE_URL)
+
+
+class LazyAsyncBindSession(Session):
+    """Sync session behind an AsyncSession, falling back to get_async_engine() when it was not given a bind."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        try:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        except UnboundExecutionError:
+            return get_async_engine().sync_engine
+
+
+# Async database session setup. Instances stay loaded after commit, because lazy loads cannot run outside
+# the event loop.
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=LazyAsyncBindSession, autocommit=False, autoflush=False, expire_on_commit=False
+)
+
+
+async def create_all_tables():
+    """Create all tables in the database, and the upcoming chat partitions on Postgres."""
+    async with get_async_engine().begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(schema.ensure_chat_partitions)
+
+
+async def maintain_chat_partitions(months_ahead: int = 2):
+    """Async version of schema.maintain_chat_partitions, to be run on a schedule."""
+    async with get_async_engine().begin() as connection:
+        return await connection.run_sync(schema.ensure_chat_partitions, months_ahead)
+
+
+async def drop_all_tables():
+    """Drop all tables in the database."""
+    async with get_async_engine().begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+
+
+@asynccontextmanager
+async def transaction(db_session: AsyncSession):
+    """
+    Run several async CRUD calls as one atomic transaction, like schema.transaction. Everything is committed once
+    when the block exits, or rolled back if it raises. A nested block joins the outer transaction.
+    """
+    info = db_session.sync_session.info
+    if info.get("defer_commit"):
+        yield db_session
+        return
+    info["defer_commit"] = True
+    try:
+        yield db_session
+        await db_session.commit()
+    except BaseException:
+        await db_session.rollback()
+        raise
+    finally:
+        info.pop("defer_commit", None)
+
+
+def _run_sync(function):
+    """Async version of a schema CRUD function, run against the sync session behind an AsyncSession."""
+    @functools.wraps(function)
+    async def wrapper(db_session: AsyncSession, *args, **kwargs):
+        return await db_session.run_sync(function, *args, **kwargs)
+    return wrapper
+
+
+async def _stream_all(db_session: AsyncSession, model, batch_size: int, as_tuples: bool):
+    """Async version of schema._stream_all, yielding every row of a model's table in ID order."""
+    statement = select(*model.__table__.columns) if as_tuples else select(model)
+    result = await db_session.stream(statement.order_by(model.id).execution_options(yield_per=batch_size))
+    try:
+        async for row in (result if as_tuples else result.scalars()):
+            yield row
+    finally:
+        await result.close()
+
+
+def stream_all_users(db_session: AsyncSession, batch_size: int = 1000, as_tuples: bool = False):
+    """Stream all users from the database, batch_size rows at a time."""
+    return _stream_all(db_session, User, batch_size, as_tuples)
+
+
+def stream_all_term_definitions(db_session: AsyncSession, batch_size: int = 1000, as_tuples: bool = False):
+    """Stream all lay glossary entries from the database, batch_size rows at a time."""
+    return _stream_all(db_session, LayGlossary, batch_size, as_tuples)
+
+
+def stream_all_ctps(db_session: AsyncSession, batch_size: int = 1000, as_tuples: bool = False):
+    """Stream all CTP entries from the database, batch_size rows at a time."""
+    return _stream_all(db_session, CTPs, batch_size, as_tuples)
+
+
+def stream_all_lps(db_session: AsyncSession, batch_size: int = 1000, as_tuples: bool = False):
+    """Stream all Lay Protocol Summary (LPS) entries from the database, batch_size rows at a time."""
+    return _stream_all(db_session, LPS, batch_size, as_tuples)
+
+
+def stream_all_bs(db_session: AsyncSession, batch_size: int = 1000, as_tuples: bool = False):
+    """Stream all Brief Summary (BS) entries from the database, batch_size rows at a time."""
+    return _stream_all(db_session, BS, batch_size, as_tuples)
+
+
+# CRUD operations, with the same signatures as in schema but taking an AsyncSession and awaited
+
+create_user = _run_sync(schema.create_user)
+get_user = _run_sync(schema.get_user)
+get_user_cached = _run_sync(schema.get_user_cached)
+get_all_users = _run_sync(schema.get_all_users)
+update_user = _run_sync(schema.update_user)
+delete_user = _run_sync(schema.delete_user)
+
+create_prompt = _run_sync(schema.create_prompt)
+get_prompt = _run_sync(schema.get_prompt)
+get_all_prompts = _run_sync(schema.get_all_prompts)
+update_prompt = _run_sync(schema.update_prompt)
+delete_prompt = _run_sync(schema.delete_prompt)
+
+archive_idle_chat_sessions = _run_sync(schema.archive_idle_chat_sessions)
+create_chat_message = _run_sync(schema.create_chat_message)
+get_chat_messages_for_user_session = _run_sync(schema.get_chat_messages_for_user_session)
+get_chat_messages_for_last_session = _run_sync(schema.get_chat_messages_for_last_session)
+get_chat_context_window = _run_sync(schema.get_chat_context_window)
+get_all_chat_messages_for_user = _run_sync(schema.get_all_chat_messages_for_user)
+search_chat_messages = _run_sync(schema.search_chat_messages)
+update_chat_message_rating = _run_sync(schema.update_chat_message_rating)
+backfill_chat_token_counts = _run_sync(schema.backfill_chat_token_counts)
+delete_chat_message = _run_sync(schema.delete_chat_message)
+delete_chat_session = _run_sync(schema.delete_chat_session)
+delete_user_chats = _run_sync(schema.delete_user_chats)
+get_user_chat_ratings = _run_sync(schema.get_user_chat_ratings)
+get_session_chat_ratings = _run_sync(schema.get_session_chat_ratings)
+get_daily_chat_ratings = _run_sync(schema.get_daily_chat_ratings)
+rebuild_chat_rating_rollups = _run_sync(schema.rebuild_chat_rating_rollups)
+
+create_term_definition = _run_sync(schema.create_term_definition)
+get_term_definition = _run_sync(schema.get_term_definition)
+get_all_term_definitions = _run_sync(schema.get_all_term_definitions)
+search_term_definitions = _run_sync(schema.search_term_definitions)
+update_term_definition = _run_sync(schema.update_term_definition)
+delete_term_definition = _run_sync(schema.delete_term_definition)
+create_lay_glossary = _run_sync(schema.create_lay_glossary)
+delete_lay_glossary = _run_sync(schema.delete_lay_glossary)
+
+create_ctp = _run_sync(schema.create_ctp)
+get_ctp = _run_sync(schema.get_ctp)
+get_ctp_cached = _run_sync(schema.get_ctp_cached)
+get_all_ctps = _run_sync(schema.get_all_ctps)
+get_ctp_bundle = _run_sync(schema.get_ctp_bundle)
+get_ctps_by_categories = _run_sync(schema.get_ctps_by_categories)
+get_ctps_by_metadata = _run_sync(schema.get_ctps_by_metadata)
+get_ctps_with_metadata_key = _run_sync(schema.get_ctps_with_metadata_key)
+update_ctp = _run_sync(schema.update_ctp)
+delete_ctp = _run_sync(schema.delete_ctp)
+
+create_lps = _run_sync(schema.create_lps)
+get_lps = _run_sync(schema.get_lps)
+get_all_lps = _run_sync(schema.get_all_lps)
+update_lps = _run_sync(schema.update_lps)
+delete_lps = _run_sync(schema.delete_lps)
+
+create_bs = _run_sync(schema.create_bs)
+get_bs = _run_sync(schema.get_bs)
+get_all_bs = _run_sync(schema.get_all_bs)
+update_bs = _run_sync(schema.update_bs)
+delete_bs = _run_sync(schema.delete_bs)
+
+bulk_create_users = _run_sync(schema.bulk_create_users)
+bulk_update_users = _run_sync(schema.bulk_update_users)
+bulk_delete_users = _run_sync(schema.bulk_delete_users)
+bulk_create_ctps = _run_sync(schema.bulk_create_ctps)
+bulk_update_ctps = _run_sync(schema.bulk_update_ctps)
+bulk_delete_ctps = _run_sync(schema.bulk_delete_ctps)
+bulk_create_lps = _run_sync(schema.bulk_create_lps)
+bulk_update_lps = _run_sync(schema.bulk_update_lps)
+bulk_delete_lps = _run_sync(schema.bulk_delete_lps)
+bulk_create_bs = _run_sync(schema.bulk_create_bs)
+bulk_update_bs = _run_sync(schema.bulk_update_bs)
+bulk_delete_bs = _run_sync(schema.bulk_delete_bs)
+
+
+# Example usage in an async script or FastAPI endpoint
+if __name__ == "__main__":
+    import asyncio
+
+    async def main():
+        try:
+            await create_all_tables()
+            async with AsyncSessionLocal() as db:
+                new_user = await create_user(db, schema.UserCreate(name="John Doe", email="john@example.com", role="user"))
+                print(schema.UserOut.model_validate(await get_user(db, new_user.id)))
+            await drop_all_tables()
+        finally:
+            # aiosqlite connections run on threads that keep the interpreter alive until the engine is disposed
+            await get_async_engine().dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,568 @@
+from sqlalchemy import create_engine, event, insert, select, func, cast, type_coerce, make_url
+from sqlalchemy.types import TEXT
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import schema
+from schema import (
+    Base, User, Prompt, Chat, LayGlossary, CTPs, LPS, BS,
+    UserCreate, UserOut, PromptCreate, ChatCreate, UpdateChat, TermDefinitionCreate, LayGlossaryCreate, CTPsCreate, LPSCreate, BSCreate,
+    JSONType, ArrayType, JSON_CODECS, build_engine,
+    get_ctp, get_ctp_bundle, get_user, bulk_create_users, ensure_chat_partitions, _sync_ctp_filter_index,
+)
+import async_schema
+import numpy as np
+import typing as t
+import asyncio
+import tempfile
+import argparse
+import random
+import json
+import time
+import os
+
+
+@contextmanager
+def count_statements(engine):
+    """Count the SQL statements sent through an engine while the context is open."""
+    counter = {"statements": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def temporary_database(database_url: t.Optional[str] = None):
+    """
+    Yield an engine with all tables created, on a throwaway file-backed SQLite database unless a URL is given.
+    The tables are dropped before and after the run, so the application's own DATABASE_URL is refused. With
+    Postgres models (ENVIRONMENT=prod) the tables cannot be created on SQLite, so a URL has to be given.
+    """
+    if not database_url and schema.DATABASE_BACKEND == "postgresql":
+        raise ValueError("Postgres models need a throwaway Postgres database, pass database_url or set BENCHMARK_DATABASE_URL")
+    if database_url and make_url(database_url) == make_url(schema.DATABASE_URL):
+        raise ValueError("Refusing to benchmark against DATABASE_URL, its tables would be dropped. Pass a throwaway database")
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(database_url or f"sqlite:///{os.path.join(directory, 'benchmark.db')}")
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        try:
+            yield engine
+        finally:
+            Base.metadata.drop_all(engine)
+            engine.dispose()
+
+
+def seed_ctps(db_session, count: int, documents_per_ctp: int = 1) -> t.List[int]:
+    """Insert count CTPs, each with documents_per_ctp LPS and BS entries, and return the CTP IDs."""
+    ctp_ids = db_session.scalars(insert(CTPs).returning(CTPs.id), [
+        {"cpt_id": f"cpt_{i}", "apollo_index_id": f"index_{i}", "ctp_metadata": {}, "categories": []}
+        for i in range(count)
+    ]).all()
+    for model, uri in [(LPS, "lps_uri"), (BS, "bs_uri")]:
+        db_session.execute(insert(model), [
+            {"ctp_id": ctp_id, uri: f"{uri}_{ctp_id}_{j}", "llm_judge_rating": 0.0, "llm_judge_scores": {}}
+            for ctp_id in ctp_ids for j in range(documents_per_ctp)
+        ])
+    db_session.commit()
+    return ctp_ids
+
+
+def fetch_ctps_one_by_one(db_session, ctp_ids: t.List[int]):
+    """Assemble each CTP with its LPS and BS entries through separate round trips, as callers did before get_ctp_bundle."""
+    bundles = []
+    for ctp_id in ctp_ids:
+        ctp = get_ctp(db_session, ctp_id)
+        lps = db_session.query(LPS).filter(LPS.ctp_id == ctp_id).all()
+        bs = db_session.query(BS).filter(BS.ctp_id == ctp_id).all()
+        bundles.append((ctp, lps, bs))
+    return bundles
+
+
+def benchmark_ctp_bundle(sizes: t.Iterable[int] = (1, 100, 10_000), database_url: t.Optional[str] = None):
+    """Compare the time and statement count of fetching CTPs one by one against get_ctp_bundle."""
+    results = []
+    with temporary_database(database_url) as engine:
+        Session = sessionmaker(bind=engine)
+        with Session() as db_session:
+            ctp_ids = seed_ctps(db_session, max(sizes))
+        for size in sizes:
+            for name, fetch in [("one_by_one", fetch_ctps_one_by_one), ("bundle", get_ctp_bundle)]:
+                with Session() as db_session, count_statements(engine) as counter:
+                    start = time.perf_counter()
+                    fetch(db_session, ctp_ids[:size])
+                    elapsed = time.perf_counter() - start
+                results.append({"ctps": size, "method": name, "seconds": elapsed, "statements": counter["statements"]})
+    return results
+
+
+def _pool_overrides(engine, concurrency: int) -> dict:
+    """Pool settings giving every concurrent request its own connection, where the pool is configurable."""
+    if engine.dialect.name != "postgresql":
+        return {}
+    return {"pool_size": concurrency, "max_overflow": 0}
+
+
+def _sync_requests(engine, user_ids: t.List[int], concurrency: int) -> float:
+    """Serve get_user requests from a thread pool, as a sync FastAPI endpoint would, and return the seconds taken."""
+    url = engine.url.render_as_string(hide_password=False)
+    pooled_engine = create_engine(url, **_pool_overrides(engine, concurrency))
+    Session = sessionmaker(bind=pooled_engine)
+
+    def request(user_id: int):
+        with Session() as db_session:
+            return UserOut.model_validate(get_user(db_session, user_id))
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            list(executor.map(request, user_ids))
+            return time.perf_counter() - start
+    finally:
+        pooled_engine.dispose()
+
+
+async def _async_requests(engine, user_ids: t.List[int], concurrency: int) -> float:
+    """Serve get_user requests as concurrent coroutines on one event loop, and return the seconds taken."""
+    url = engine.url.render_as_string(hide_password=False)
+    async_engine = async_schema.build_async_engine(url, **_pool_overrides(engine, concurrency))
+    AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request(user_id: int):
+        async with semaphore, AsyncSession() as db_session:
+            return UserOut.model_validate(await async_schema.get_user(db_session, user_id))
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(request(user_id) for user_id in user_ids))
+        return time.perf_counter() - start
+    finally:
+        await async_engine.dispose()
+
+
+def benchmark_async_concurrency(requests: int = 2000, concurrency: int = 50, database_url: t.Optional[str] = None):
+    """Compare the requests per second of the sync CRUD functions on a thread pool against the async CRUD layer."""
+    with temporary_database(database_url) as engine:
+        with sessionmaker(bind=engine)() as db_session:
+            seeded = bulk_create_users(db_session, [
+                UserCreate(name=f"User {i}", email=f"user{i}@example.com", role="user") for i in range(100)
+            ])
+        user_ids = [seeded[i % len(seeded)] for i in range(requests)]
+        timings = {
+            "sync_threads": _sync_requests(engine, user_ids, concurrency),
+            "async": asyncio.run(_async_requests(engine, user_ids, concurrency)),
+        }
+    return [
+        {"mode": mode, "requests": requests, "concurrency": concurrency, "seconds": seconds,
+         "requests_per_second": requests / seconds}
+        for mode, seconds in timings.items()
+    ]
+
+
+def _decoded_columns(dialect_name: str, codec: t.Optional[str]) -> t.Dict[str, t.Any]:
+    """
+    The JSON and array columns read with a codec, or as undecoded text when codec is None. On Postgres the driver
+    decodes JSONB with the engine's json_deserializer, and ARRAY natively.
+    """
+    columns = {"ctps.ctp_metadata": CTPs.ctp_metadata, "ctps.categories": CTPs.categories, "lps.llm_judge_scores": LPS.llm_judge_scores}
+    if codec is None:
+        return {name: cast(column, TEXT) for name, column in columns.items()}
+    if dialect_name == "postgresql":
+        return columns
+    return {
+        name: type_coerce(column, ArrayType(codec) if name == "ctps.categories" else JSONType(codec))
+        for name, column in columns.items()
+    }
+
+
+def benchmark_codecs(rows: int = 100_000, repeats: int = 3, database_url: t.Optional[str] = None):
+    """
+    Rows per second of reading the CTP metadata, CTP categories and LPS judge scores columns with each of
+    JSON_CODECS, against reading the same columns as undecoded text. Each read is the best of repeats runs.
+    """
+    results = []
+    with temporary_database(database_url) as engine:
+        with engine.begin() as connection:
+            connection.execute(insert(CTPs), [
+                {
+                    "cpt_id": f"cpt_{i}",
+                    "apollo_index_id": f"index_{i}",
+                    "ctp_metadata": {"phase": i % 4, "sponsor": f"sponsor_{i % 50}", "sites": list(range(i % 8)), "blinded": i % 2 == 0},
+                    "categories": [f"category_{(i + j) % 20}" for j in range(4)],
+                }
+                for i in range(rows)
+            ])
+            connection.execute(insert(LPS), [
+                {
+                    "ctp_id": i + 1,
+                    "lps_uri": f"lps_{i}",
+                    "llm_judge_scores": {
+                        section: {metric: (i * 7 + len(metric)) % 5 for metric in ["clarity", "accuracy", "completeness", "readability"]}
+                        for section in ["summary", "eligibility", "procedures", "risks"]
+                    },
+                }
+                for i in range(rows)
+            ])
+        url = engine.url.render_as_string(hide_password=False)
+        for codec in [None, *JSON_CODECS]:
+            overrides = {"json_serializer": JSON_CODECS[codec].dumps, "json_deserializer": JSON_CODECS[codec].loads} if codec else {}
+            codec_engine = build_engine(url, **overrides)
+            try:
+                with codec_engine.connect() as connection:
+                    for name, column in _decoded_columns(engine.dialect.name, codec).items():
+                        timings = []
+                        for _ in range(repeats):
+                            start = time.perf_counter()
+                            connection.execute(select(column)).all()
+                            timings.append(time.perf_counter() - start)
+                        results.append({"codec": codec or "undecoded", "column": name, "rows": rows,
+                                        "seconds": min(timings), "rows_per_second": rows / min(timings)})
+            finally:
+                codec_engine.dispose()
+    return results
+
+
+MESSAGES_PER_SESSION = 20
+CHAT_HISTORY_DAYS = 90
+
+
+def scale_counts(rows: int) -> t.Dict[str, int]:
+    """Rows per table for a benchmark scale: rows chat messages, a tenth as many CTPs, LPS and BS, and a hundredth as many users, prompts and glossary terms."""
+    return {
+        "users": max(rows // 100, 1),
+        "prompts": max(rows // 100, 1),
+        "chats": rows,
+        "lay_glossary": max(rows // 100, 1),
+        "ctps": max(rows // 10, 1),
+        "lps": max(rows // 10, 1),
+        "bs": max(rows // 10, 1),
+    }
+
+
+def _insert_batches(engine, table, count: int, make_row: t.Callable[[int], dict], batch_size: int):
+    """Insert count generated rows into a table, batch_size rows per transaction."""
+    for start in range(0, count, batch_size):
+        with engine.begin() as connection:
+            connection.execute(insert(table), [make_row(i) for i in range(start, min(start + batch_size, count))])
+
+
+def seed_database(engine, rows: int, batch_size: int = 10_000) -> t.Dict[str, int]:
+    """
+    Fill every table at the scale given by scale_counts(rows) with Core executemany inserts, and return the row
+    counts. Chat sessions hold MESSAGES_PER_SESSION messages spread over the last CHAT_HISTORY_DAYS days, and the
+    chat rating rollups are rebuilt from them.
+    """
+    counts = scale_counts(rows)
+    now = datetime.now(timezone.utc)
+    start = now - timedelta(days=CHAT_HISTORY_DAYS)
+    with engine.begin() as connection:
+        ensure_chat_partitions(connection, months_ahead=CHAT_HISTORY_DAYS // 28 + 1, start=start)
+    _insert_batches(engine, User.__table__, counts["users"], lambda i: {
+        "name": f"User {i}", "email": f"user{i}@example.com", "role": "user" if i % 10 else "power_user",
+    }, batch_size)
+    _insert_batches(engine, Prompt.__table__, counts["prompts"], lambda i: {"prompt_uri": f"prompts/{i}.txt"}, batch_size)
+
+    def chat_row(i: int) -> dict:
+        session = i // MESSAGES_PER_SESSION
+        message = f"question {i % 97} about trial arm {i % 13} and dose {i % 7}"
+        return {
+            "user_id": session % counts["users"] + 1,
+            "chat_session_id": session // counts["users"] + 1,
+            "message_id": i % MESSAGES_PER_SESSION + 1,
+            "message": message,
+            "token_count": len(message.split()),
+            "message_is_from_user": i % 2 == 0,
+            "user_rating": i % 3 - 1,
+            "timestamp": start + (now - start) * (i / counts["chats"]),
+        }
+
+    _insert_batches(engine, Chat.__table__, counts["chats"], chat_row, batch_size)
+    with sessionmaker(bind=engine)() as db_session:
+        schema.rebuild_chat_rating_rollups(db_session)
+    _insert_batches(engine, LayGlossary.__table__, counts["lay_glossary"], lambda i: {
+        "term": f"term {i}", "definition": f"plain language definition of term {i}",
+    }, batch_size)
+    for batch_start in range(0, counts["ctps"], batch_size):
+        batch = [
+            {
+                "cpt_id": f"cpt_{i}",
+                "apollo_index_id": f"index_{i}",
+                "ctp_metadata": {"phase": i % 4, "sponsor": f"sponsor_{i % 50}"},
+                "categories": [f"category_{i % 20}"],
+            }
+            for i in range(batch_start, min(batch_start + batch_size, counts["ctps"]))
+        ]
+        with engine.begin() as connection:
+            ctp_ids = connection.scalars(insert(CTPs.__table__).returning(CTPs.id, sort_by_parameter_order=True), batch).all()
+            _sync_ctp_filter_index(connection, [
+                (ctp_id, row["categories"], row["ctp_metadata"]) for ctp_id, row in zip(ctp_ids, batch)
+            ])
+    for model, uri in [(LPS, "lps_uri"), (BS, "bs_uri")]:
+        _insert_batches(engine, model.__table__, counts[model.__tablename__], lambda i: {
+            "ctp_id": i % counts["ctps"] + 1,
+            uri: f"{uri}_{i}",
+            "llm_judge_rating": (i * 37 % 100) / 20,
+            "llm_judge_scores": {"summary": {"clarity": i % 5, "accuracy": i * 7 % 5}},
+        }, batch_size)
+    return counts
+
+
+class _Ids:
+    """Random IDs of the seeded rows of each table, from the table's current ID range."""
+
+    def __init__(self, db_session, rng: random.Random):
+        self.rng = rng
+        self.ranges = {
+            model.__tablename__: db_session.execute(select(func.min(model.id), func.max(model.id))).one()
+            for model in [User, Prompt, Chat, LayGlossary, CTPs, LPS, BS]
+        }
+        self.sessions_per_user = max(
+            db_session.execute(select(func.max(Chat.chat_session_id))).scalar() or 1, 1
+        )
+
+    def __call__(self, table: str) -> int:
+        low, high = self.ranges[table]
+        return self.rng.randint(low or 1, high or 1)
+
+    def many(self, table: str, count: int) -> t.List[int]:
+        return [self(table) for _ in range(count)]
+
+
+def _crud_cases(ids: _Ids, bulk_size: int) -> t.List[t.Tuple[str, int, t.Callable]]:
+    """
+    (function name, iteration limit, prepare) for every public CRUD function. prepare(db_session, iterations)
+    returns one zero-argument call per iteration, after creating any rows those calls will delete. Full table
+    reads are capped at a few iterations. Destructive cases come last, so earlier cases see the seeded data.
+    """
+    rng = ids.rng
+    unique = iter(range(10 ** 12))
+
+    def calls(function, *arguments):
+        """One call per iteration, with fresh arguments from the given factories."""
+        return lambda db, n: [
+            (lambda args: lambda: function(db, *args))([argument() for argument in arguments]) for _ in range(n)
+        ]
+
+    def consume(function):
+        return lambda db, n: [lambda: sum(1 for _ in function(db)) for _ in range(n)]
+
+    def victims(create, function):
+        """Create one row per iteration to be deleted by the timed calls."""
+        return lambda db, n: [(lambda row_id: lambda: function(db, row_id))(create(db)) for _ in range(n)]
+
+    def user():
+        return UserCreate(name="Bench Doe", email=f"bench{next(unique)}@example.com", role="user")
+
+    def ctp():
+        return CTPsCreate(cpt_id=f"bench_{next(unique)}", apollo_index_id="bench", categories=["category_1"], ctp_metadata={"phase": 1})
+
+    def lps():
+        return LPSCreate(ctp_id=ids("ctps"), lps_uri=f"bench_{next(unique)}", llm_judge_rating=rng.random() * 5)
+
+    def bs():
+        return BSCreate(ctp_id=ids("ctps"), bs_uri=f"bench_{next(unique)}", llm_judge_rating=rng.random() * 5)
+
+    def chat():
+        return ChatCreate(user_id=ids("users"), chat_session_id=rng.randint(1, ids.sessions_per_user), message="bench message", message_is_from_user=True)
+
+    def term():
+        return TermDefinitionCreate(term=f"bench term {next(unique)}", definition="bench definition")
+
+    def bulk_ids(table):
+        return lambda: ids.many(table, bulk_size)
+
+    def bulk_victims(bulk_create, bulk_delete, make):
+        return lambda db, n: [
+            (lambda row_ids: lambda: bulk_delete(db, row_ids))(bulk_create(db, [make() for _ in range(bulk_size)])) for _ in range(n)
+        ]
+
+    many = 10 ** 9
+    scan = 3
+    return [
+        ("create_user", many, calls(schema.create_user, user)),
+        ("create_prompt", many, calls(schema.create_prompt, lambda: PromptCreate(prompt_uri=f"bench/{next(unique)}.txt"))),
+        ("create_chat_message", many, calls(schema.create_chat_message, chat)),
+        ("create_term_definition", many, calls(schema.create_term_definition, term)),
+        ("create_lay_glossary", scan, calls(schema.create_lay_glossary, lambda: LayGlossaryCreate(term_definitions=[term() for _ in range(100)]))),
+        ("create_ctp", many, calls(schema.create_ctp, ctp)),
+        ("create_lps", many, calls(schema.create_lps, lps)),
+        ("create_bs", many, calls(schema.create_bs, bs)),
+        ("get_user", many, calls(schema.get_user, lambda: ids("users"))),
+        ("get_user_cached", many, calls(schema.get_user_cached, lambda: ids("users"))),
+        ("get_all_users", scan, calls(schema.get_all_users)),
+        ("stream_all_users", scan, consume(schema.stream_all_users)),
+        ("get_prompt", many, calls(schema.get_prompt, lambda: ids("prompts"))),
+        ("get_all_prompts", scan, calls(schema.get_all_prompts)),
+        ("get_chat_messages_for_user_session", many, calls(
+            schema.get_chat_messages_for_user_session, lambda: ids("users"), lambda: rng.randint(1, ids.sessions_per_user))),
+        ("get_chat_messages_for_last_session", many, calls(schema.get_chat_messages_for_last_session, lambda: ids("users"))),
+        ("get_chat_context_window", many, calls(
+            schema.get_chat_context_window, lambda: ids("users"), lambda: rng.randint(1, ids.sessions_per_user), lambda: 50)),
+        ("get_user_chat_ratings", many, calls(schema.get_user_chat_ratings, lambda: ids("users"))),
+        ("get_session_chat_ratings", many, calls(
+            schema.get_session_chat_ratings, lambda: ids("users"), lambda: rng.randint(1, ids.sessions_per_user))),
+        ("get_daily_chat_ratings", many, calls(
+            schema.get_daily_chat_ratings, lambda: (datetime.now(timezone.utc) - timedelta(days=rng.randint(7, CHAT_HISTORY_DAYS))).date(),
+            lambda: datetime.now(timezone.utc).date())),
+        ("get_all_chat_messages_for_user", many, calls(schema.get_all_chat_messages_for_user, lambda: ids("users"))),
+        ("search_chat_messages", many, calls(schema.search_chat_messages, lambda: f"trial arm {rng.randint(0, 12)}")),
+        ("get_term_definition", many, calls(schema.get_term_definition, lambda: ids("lay_glossary"))),
+        ("get_all_term_definitions", scan, calls(schema.get_all_term_definitions)),
+        ("stream_all_term_definitions", scan, consume(schema.stream_all_term_definitions)),
+        ("search_term_definitions", many, calls(schema.search_term_definitions, lambda: f"term {rng.randint(0, 999)}")),
+        ("get_ctp", many, calls(schema.get_ctp, lambda: ids("ctps"))),
+        ("get_ctp_cached", many, calls(schema.get_ctp_cached, lambda: ids("ctps"))),
+        ("get_all_ctps", scan, calls(schema.get_all_ctps)),
+        ("stream_all_ctps", scan, consume(schema.stream_all_ctps)),
+        ("get_ctp_bundle", many, calls(schema.get_ctp_bundle, lambda: ids.many("ctps", 100))),
+        ("get_ctps_by_categories", many, calls(schema.get_ctps_by_categories, lambda: [f"category_{rng.randint(0, 19)}"])),
+        ("get_ctps_by_metadata", many, calls(schema.get_ctps_by_metadata, lambda: {"sponsor": f"sponsor_{rng.randint(0, 49)}"})),
+        ("get_ctps_with_metadata_key", many, calls(schema.get_ctps_with_metadata_key, lambda: "phase")),
+        ("get_lps", many, calls(schema.get_lps, lambda: ids("lps"))),
+        ("get_all_lps", scan, calls(schema.get_all_lps)),
+        ("stream_all_lps", scan, consume(schema.stream_all_lps)),
+        ("get_bs", many, calls(schema.get_bs, lambda: ids("bs"))),
+        ("get_all_bs", scan, calls(schema.get_all_bs)),
+        ("stream_all_bs", scan, consume(schema.stream_all_bs)),
+        ("update_user", many, calls(schema.update_user, lambda: ids("users"), user)),
+        ("update_prompt", many, calls(schema.update_prompt, lambda: ids("prompts"), lambda: PromptCreate(prompt_uri="bench/updated.txt"))),
+        ("update_chat_message_rating", many, calls(
+            schema.update_chat_message_rating, lambda: UpdateChat(chat_id=ids("chats"), user_rating=rng.choice([-1, 0, 1])))),
+        ("backfill_chat_token_counts", 1, calls(schema.backfill_chat_token_counts)),
+        ("rebuild_chat_rating_rollups", 1, calls(schema.rebuild_chat_rating_rollups)),
+        ("update_term_definition", many, calls(schema.update_term_definition, lambda: ids("lay_glossary"), term)),
+        ("update_ctp", many, calls(schema.update_ctp, lambda: ids("ctps"), ctp)),
+        ("update_lps", many, calls(schema.update_lps, lambda: ids("lps"), lps)),
+        ("update_bs", many, calls(schema.update_bs, lambda: ids("bs"), bs)),
+        ("bulk_create_users", many, calls(schema.bulk_create_users, lambda: [user() for _ in range(bulk_size)])),
+        ("bulk_create_ctps", many, calls(schema.bulk_create_ctps, lambda: [ctp() for _ in range(bulk_size)])),
+        ("bulk_create_lps", many, calls(schema.bulk_create_lps, lambda: [lps() for _ in range(bulk_size)])),
+        ("bulk_create_bs", many, calls(schema.bulk_create_bs, lambda: [bs() for _ in range(bulk_size)])),
+        ("bulk_update_users", many, calls(schema.bulk_update_users, lambda: {user_id: user() for user_id in ids.many("users", bulk_size)})),
+        ("bulk_update_ctps", many, calls(schema.bulk_update_ctps, lambda: {ctp_id: ctp() for ctp_id in ids.many("ctps", bulk_size)})),
+        ("bulk_update_lps", many, calls(schema.bulk_update_lps, lambda: {lps_id: lps() for lps_id in ids.many("lps", bulk_size)})),
+        ("bulk_update_bs", many, calls(schema.bulk_update_bs, lambda: {bs_id: bs() for bs_id in ids.many("bs", bulk_size)})),
+        ("archive_idle_chat_sessions", 1, calls(schema.archive_idle_chat_sessions, lambda: CHAT_HISTORY_DAYS - 5)),
+        ("delete_user", many, victims(lambda db: schema.create_user(db, user()).id, schema.delete_user)),
+        ("delete_prompt", many, victims(lambda db: schema.create_prompt(db, PromptCreate(prompt_uri="bench/victim.txt")).id, schema.delete_prompt)),
+        ("delete_chat_message", many, victims(lambda db: schema.create_chat_message(db, chat()).id, schema.delete_chat_message)),
+        ("delete_chat_session", many, calls(schema.delete_chat_session, lambda: ids("users"), lambda: rng.randint(1, ids.sessions_per_user))),
+        ("delete_user_chats", many, calls(schema.delete_user_chats, lambda: ids("users"))),
+        ("delete_term_definition", many, victims(lambda db: schema.create_term_definition(db, term()).id, schema.delete_term_definition)),
+        ("delete_ctp", many, victims(lambda db: schema.create_ctp(db, ctp()).id, schema.delete_ctp)),
+        ("delete_lps", many, victims(lambda db: schema.create_lps(db, lps()).id, schema.delete_lps)),
+        ("delete_bs", many, victims(lambda db: schema.create_bs(db, bs()).id, schema.delete_bs)),
+        ("bulk_delete_users", many, bulk_victims(schema.bulk_create_users, schema.bulk_delete_users, user)),
+        ("bulk_delete_ctps", many, bulk_victims(schema.bulk_create_ctps, schema.bulk_delete_ctps, ctp)),
+        ("bulk_delete_lps", many, bulk_victims(schema.bulk_create_lps, schema.bulk_delete_lps, lps)),
+        ("bulk_delete_bs", many, bulk_victims(schema.bulk_create_bs, schema.bulk_delete_bs, bs)),
+        ("delete_lay_glossary", 1, calls(schema.delete_lay_glossary)),
+    ]
+
+
+def _latency_summary(latencies: t.List[float]) -> dict:
+    """Operations per second and latency percentiles in milliseconds of a list of call durations in seconds."""
+    milliseconds = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99]).tolist()
+    return {
+        "iterations": len(latencies),
+        "ops_per_second": len(latencies) / sum(latencies) if sum(latencies) else None,
+        "mean_ms": float(milliseconds.mean()),
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+    }
+
+
+def benchmark_crud_suite(rows: int = 100_000, iterations: int = 100, bulk_size: int = 100,
+                         database_url: t.Optional[str] = None, functions: t.Optional[t.Iterable[str]] = None,
+                         seed: int = 0) -> dict:
+    """
+    Seed every table at the scale of rows chat messages, then call each public CRUD function iterations times
+    with random seeded IDs and report its ops/sec and p50/p95/p99 latency. Each case runs in its own session,
+    cleared between calls so the identity map does not hide round trips.
+    """
+    rng = random.Random(seed)
+    report = {"rows": rows, "iterations": iterations, "bulk_size": bulk_size, "results": {}}
+    with temporary_database(database_url) as engine:
+        report["database"] = engine.dialect.name
+        start = time.perf_counter()
+        report["counts"] = seed_database(engine, rows)
+        report["seed_seconds"] = time.perf_counter() - start
+        Session = sessionmaker(bind=engine)
+        with Session() as db_session:
+            ids = _Ids(db_session, rng)
+        selected = set(functions) if functions else None
+        for name, limit, prepare in _crud_cases(ids, bulk_size):
+            if selected is not None and name not in selected:
+                continue
+            schema.get_entity_cache().clear()
+            with Session() as db_session:
+                latencies = []
+                for call in prepare(db_session, min(iterations, limit)):
+                    db_session.expunge_all()
+                    started = time.perf_counter()
+                    call()
+                    latencies.append(time.perf_counter() - started)
+            report["results"][name] = _latency_summary(latencies)
+    return report
+
+
+def default_benchmark_database_url() -> t.Optional[str]:
+    """BENCHMARK_DATABASE_URL when it is set, otherwise None for a temporary SQLite file."""
+    return os.getenv("BENCHMARK_DATABASE_URL") or None
+
+
+# Example usage
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the postgres_example CRUD layer.")
+    parser.add_argument("--suite", choices=["bundle", "async", "crud", "codecs"], default="bundle",
+                        help="bundle: CTP bundle fetches against one-by-one fetches. async: async CRUD against sync CRUD "
+                             "on threads. crud: every CRUD function against seeded tables. codecs: JSON and array "
+                             "column decoding with each JSON codec")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=100_000,
+                        help="Chat messages to seed for the crud suite, other tables scale from it. CTPs and LPS for the codecs suite")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--bulk-size", type=int, default=100)
+    parser.add_argument("--functions", nargs="+", default=None, help="Only time these CRUD functions")
+    parser.add_argument("--report", default="benchmark_report.json", help="JSON report path for the crud suite")
+    parser.add_argument("--database-url", default=default_benchmark_database_url(),
+                        help="Throwaway database to benchmark, its tables are dropped. Defaults to BENCHMARK_DATABASE_URL, "
+                             "or a temporary SQLite file when unset. Never DATABASE_URL")
+    args = parser.parse_args()
+    if not args.database_url and schema.DATABASE_BACKEND == "postgresql":
+        parser.error("Postgres models need a throwaway Postgres database, pass --database-url or set BENCHMARK_DATABASE_URL")
+    if args.database_url and make_url(args.database_url) == make_url(schema.DATABASE_URL):
+        parser.error("--database-url must not be DATABASE_URL, the benchmark drops its tables")
+
+    if args.suite == "crud":
+        report = benchmark_crud_suite(args.rows, args.iterations, args.bulk_size, args.database_url, args.functions)
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Seeded {report['counts']} on {report['database']} in {report['seed_seconds']:.1f}s")
+        for name, result in report["results"].items():
+            print(f"{name:<36} {result['ops_per_second']:>10.1f} ops/s  p50 {result['p50_ms']:.2f}ms  "
+                  f"p95 {result['p95_ms']:.2f}ms  p99 {result['p99_ms']:.2f}ms")
+        print(f"Report written to {args.report}")
+    elif args.suite == "codecs":
+        for result in benchmark_codecs(args.rows, database_url=args.database_url):
+            print(f"{result['column']:<22} {result['codec']:<10}  {result['seconds']:.3f}s  {result['rows_per_second']:>12,.0f} rows/s")
+    elif args.suite == "bundle":
+        for result in benchmark_ctp_bundle(args.sizes, args.database_url):
+            print(f"{result['ctps']:>7} CTPs  {result['method']:<10}  {result['seconds']:.4f}s  {result['statements']} statements")
+    else:
+        for result in benchmark_async_concurrency(args.requests, args.concurrency, args.database_url):
+            print(f"{result['mode']:<13}  {result['requests']} requests  concurrency {result['concurrency']}  "
+                  f"{result['seconds']:.3f}s  {result['requests_per_second']:.0f} req/s")
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+import typing as t
+import threading
+import time
+
+
+MISSING = object()
+
+
+class LocalCache:
+    """Thread-safe in-process LRU cache whose entries expire ttl seconds after they were set."""
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[t.Hashable, t.Tuple[float, t.Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: t.Hashable):
+        """Return the cached value, or MISSING when the key is absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: t.Hashable, value):
+        """Cache a value, evicting the least recently used entries beyond max_size."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: t.Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InMemorySharedCache:
+    """
+    Stand-in for a shared cache such as Redis, for tests and single-process deployments. Like Redis it stores
+    bytes under string keys with a TTL, so values go through the same serialization as in production.
+    """
+
+    def __init__(self):
+        self._entries: t.Dict[str, t.Tuple[float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> t.Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Shared cache backed by Redis. Requires the redis package, which is only imported when this class is used."""
+
+    def __init__(self, url: str, prefix: str = "research-sandbox:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> t.Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def delete(self, *keys: str):
+        if keys:
+            self._client.delete(*[self.prefix + key for key in keys])
+
+
+class EntityCache:
+    """
+    Two-tier read-through cache for Pydantic models of database entities.
+
+    Lookups try the in-process LRU first, then the shared backend if there is one, and only then the loader.
+    Invalidation removes an entity from the local tier of this process and from the shared backend. Other
+    processes can serve their local copy until it expires, so keep local_ttl short when running several workers.
+    """
+
+    def __init__(self, local: t.Optional[LocalCache] = None, shared=None, shared_ttl: float = 300.0):
+        self.local = local if local is not None else LocalCache()
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(namespace: str, entity_id) -> str:
+        return f"{namespace}:{entity_id}"
+
+    def get(self, namespace: str, entity_id, model: t.Type, loader: t.Callable[[], t.Any]):
+        """
+        Return the cached model of an entity, or load it, convert it with model.model_validate and cache it.
+        Entities the loader does not find are not cached. Treat returned models as read-only, they are shared.
+        """
+        key = self._key(namespace, entity_id)
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+        if self.shared is not None:
+            payload = self.shared.get(key)
+            if payload is not None:
+                self.hits += 1
+                value = model.model_validate_json(payload)
+                self.local.set(key, value)
+                return value
+        self.misses += 1
+        loaded = loader()
+        if loaded is None:
+            return None
+        value = model.model_validate(loaded)
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value.model_dump_json().encode(), self.shared_ttl)
+        return value
+
+    def invalidate(self, namespace: str, *entity_ids):
+        """Remove entities from the local tier and the shared backend."""
+        keys = [self._key(namespace, entity_id) for entity_id in entity_ids]
+        for key in keys:
+            self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(*keys)
+
+    def clear(self):
+        """Empty the local tier, and the shared backend when it supports it."""
+        self.local.clear()
+        if self.shared is not None and hasattr(self.shared, "clear"):
+            self.shared.clear()
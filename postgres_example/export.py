@@ -0,0 +1,144 @@
+from sqlalchemy import select, literal
+from schema import CTPs, LPS, BS, SessionLocal
+import pyarrow as pa
+import pyarrow.parquet as pq
+import typing as t
+import argparse
+
+
+SCORE_COLUMN_PREFIX = "llm_judge_scores"
+
+# Columns shared by every exported LPS and BS row, before the flattened judge score columns
+DOCUMENT_FIELDS = [
+    pa.field("document_type", pa.string()),
+    pa.field("document_id", pa.int64()),
+    pa.field("ctp_id", pa.int64()),
+    pa.field("cpt_id", pa.string()),
+    pa.field("apollo_index_id", pa.string()),
+    pa.field("categories", pa.list_(pa.string())),
+    pa.field("uri", pa.string()),
+    pa.field("llm_judge_rating", pa.float64()),
+    pa.field("last_updated", pa.timestamp("us", tz="UTC")),
+]
+
+
+def flatten_judge_scores(scores: t.Optional[dict], prefix: str = SCORE_COLUMN_PREFIX) -> t.Dict[str, float]:
+    """Flatten nested per-section/per-metric judge scores into {"llm_judge_scores.<section>.<metric>": score}, skipping non-numeric values."""
+    flat = {}
+    for key, value in (scores or {}).items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten_judge_scores(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def _document_queries():
+    """One query per document table, joining every LPS or BS row to its CTP."""
+    for document_type, model, uri in [("lps", LPS, LPS.lps_uri), ("bs", BS, BS.bs_uri)]:
+        yield select(
+            literal(document_type).label("document_type"),
+            model.id.label("document_id"),
+            CTPs.id.label("ctp_id"),
+            CTPs.cpt_id,
+            CTPs.apollo_index_id,
+            CTPs.categories,
+            uri.label("uri"),
+            model.llm_judge_rating,
+            model.last_updated,
+            model.llm_judge_scores,
+        ).select_from(model).join(CTPs, CTPs.id == model.ctp_id).order_by(model.id)
+
+
+def discover_score_columns(db_session, batch_size: int = 10_000) -> t.List[str]:
+    """Stream the judge scores of every LPS and BS row and return the sorted names of their flattened columns."""
+    names = set()
+    for model in [LPS, BS]:
+        result = db_session.execute(select(model.llm_judge_scores).execution_options(yield_per=batch_size))
+        try:
+            for scores in result.scalars():
+                names.update(flatten_judge_scores(scores))
+        finally:
+            result.close()
+    return sorted(names)
+
+
+def document_schema(score_columns: t.Iterable[str]) -> pa.Schema:
+    """Arrow schema of the exported rows: the document fields followed by one float column per judge score."""
+    return pa.schema(DOCUMENT_FIELDS + [pa.field(name, pa.float64()) for name in score_columns])
+
+
+def _to_record_batch(rows, schema: pa.Schema) -> pa.RecordBatch:
+    """Convert a batch of joined rows to an Arrow record batch, one column at a time."""
+    base_names = [field.name for field in DOCUMENT_FIELDS]
+    score_names = schema.names[len(base_names):]
+    columns = {name: [] for name in schema.names}
+    for row in rows:
+        values = row._mapping
+        for name in base_names:
+            columns[name].append(values[name])
+        scores = flatten_judge_scores(values["llm_judge_scores"])
+        for name in score_names:
+            columns[name].append(scores.get(name))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(columns[field.name], type=field.type) for field in schema], schema=schema
+    )
+
+
+def iter_document_batches(db_session, schema: pa.Schema, batch_size: int = 10_000) -> t.Iterator[pa.RecordBatch]:
+    """Stream every LPS and BS row joined to its CTP as Arrow record batches of at most batch_size rows."""
+    for statement in _document_queries():
+        result = db_session.execute(statement.execution_options(yield_per=batch_size))
+        try:
+            for rows in result.partitions():
+                yield _to_record_batch(rows, schema)
+        finally:
+            result.close()
+
+
+def export_documents(
+    db_session,
+    path: str,
+    file_format: t.Literal["parquet", "arrow"] = "parquet",
+    compression: str = "zstd",
+    batch_size: int = 10_000,
+    score_columns: t.Optional[t.List[str]] = None,
+) -> int:
+    """
+    Write every LPS and BS row, joined to its CTP and with flattened judge scores, to a compressed Parquet or
+    Arrow IPC file, and return the number of rows written.
+
+    Rows are streamed batch_size at a time, so memory does not grow with the table size. When score_columns is
+    not given, the judge score columns are discovered with an extra pass over the scores.
+    """
+    if score_columns is None:
+        score_columns = discover_score_columns(db_session, batch_size)
+    schema = document_schema(score_columns)
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(path, schema, compression=compression)
+    elif file_format == "arrow":
+        writer = pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+    else:
+        raise ValueError(f"Unsupported file format: {file_format}")
+    rows_written = 0
+    with writer:
+        for batch in iter_document_batches(db_session, schema, batch_size):
+            writer.write_batch(batch)
+            rows_written += batch.num_rows
+    return rows_written
+
+
+# Example usage
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export CTPs with their LPS and BS rows to a columnar file.")
+    parser.add_argument("path", help="Output file path")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--compression", default="zstd")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    written = export_documents(db, args.path, args.format, args.compression, args.batch_size)
+    print(f"Exported {written} rows to {args.path}")
+    db.close()
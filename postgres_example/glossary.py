@@ -0,0 +1,207 @@
+from sqlalchemy import event
+from sqlalchemy.sql import func
+from schema import LayGlossary
+import typing as t
+import threading
+
+
+class GlossaryMatch(t.NamedTuple):
+    """A single occurrence of a glossary term in a text."""
+    start: int
+    end: int
+    term: str
+    definition: str
+
+
+def _is_word_char(char: str) -> bool:
+    """Return True for characters that cannot sit next to a term without joining it (letters, digits, underscore)."""
+    return char.isalnum() or char == "_"
+
+
+class GlossaryMatcher:
+    """
+    Aho-Corasick automaton over the lay glossary terms.
+
+    Terms and texts are case-folded, so "Placebo" matches "placebo" and "PLACEBO", and a match is only reported
+    when it does not start or end in the middle of a word. Every occurrence in a text is found in a single pass,
+    regardless of how many terms the glossary holds.
+    """
+
+    def __init__(self, term_definitions: t.Iterable[t.Tuple[str, str]]):
+        # State 0 is the root. _goto[state] maps a character to the next state.
+        self._goto: t.List[t.Dict[str, int]] = [{}]
+        self._fail: t.List[int] = [0]
+        # Pattern index ending at each state, and the nearest state on the fail chain that ends a pattern.
+        self._pattern: t.List[int] = [-1]
+        self._output_link: t.List[int] = [0]
+        self._lengths: t.List[int] = []
+        self._terms: t.List[str] = []
+        self._definitions: t.List[str] = []
+        for term, definition in term_definitions:
+            self._add(term, definition)
+        self._build_fail_links()
+
+    def __len__(self):
+        return len(self._terms)
+
+    def _add(self, term: str, definition: str):
+        """Add a term to the trie. The first definition of a term wins when the glossary holds duplicates."""
+        folded = term.strip().casefold()
+        if not folded:
+            return
+        state = 0
+        for char in folded:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._pattern.append(-1)
+                self._output_link.append(0)
+            state = next_state
+        if self._pattern[state] == -1:
+            self._pattern[state] = len(self._terms)
+            self._lengths.append(len(folded))
+            self._terms.append(term.strip())
+            self._definitions.append(definition)
+
+    def _build_fail_links(self):
+        """Breadth-first pass that sets the fail and output links of every state."""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._output_link[next_state] = fail if self._pattern[fail] != -1 else self._output_link[fail]
+
+    @staticmethod
+    def _fold(text: str) -> t.Tuple[str, t.List[int]]:
+        """Case-fold a text, keeping the offset in the original text of every folded character."""
+        folded = []
+        offsets = []
+        for index, char in enumerate(text):
+            folded_char = char.casefold()
+            folded.append(folded_char)
+            offsets.extend([index] * len(folded_char))
+        return "".join(folded), offsets
+
+    def _is_bounded(self, text: str, start: int, end: int) -> bool:
+        """Check that the match text[start:end] does not continue a word on either side."""
+        if start > 0 and _is_word_char(text[start]) and _is_word_char(text[start - 1]):
+            return False
+        if end < len(text) and _is_word_char(text[end - 1]) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def find_all(self, text: str) -> t.List[GlossaryMatch]:
+        """Find every glossary term occurring in the text, including overlapping and nested terms."""
+        folded, offsets = self._fold(text)
+        goto, fail, pattern, output_link = self._goto, self._fail, self._pattern, self._output_link
+        matches = []
+        state = 0
+        for position, char in enumerate(folded):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            hit = state if pattern[state] != -1 else output_link[state]
+            while hit:
+                index = pattern[hit]
+                folded_start = position + 1 - self._lengths[index]
+                # Only report matches that start and end on whole characters of the original text
+                if folded_start == 0 or offsets[folded_start] != offsets[folded_start - 1]:
+                    start = offsets[folded_start]
+                    end = offsets[position] + 1
+                    if (position + 1 == len(folded) or offsets[position + 1] != offsets[position]) \
+                            and self._is_bounded(text, start, end):
+                        matches.append(GlossaryMatch(start, end, self._terms[index], self._definitions[index]))
+                hit = output_link[hit]
+        matches.sort(key=lambda match: (match.start, -match.end))
+        return matches
+
+    def annotate(self, text: str) -> t.List[GlossaryMatch]:
+        """Find the leftmost-longest, non-overlapping glossary terms in the text, for annotating it with definitions."""
+        selected = []
+        covered_until = 0
+        for match in self.find_all(text):
+            if match.start >= covered_until:
+                selected.append(match)
+                covered_until = match.end
+        return selected
+
+    def find_all_many(self, texts: t.Iterable[str]) -> t.List[t.List[GlossaryMatch]]:
+        """Find every glossary term occurring in each of many texts."""
+        return [self.find_all(text) for text in texts]
+
+    def annotate_many(self, texts: t.Iterable[str]) -> t.List[t.List[GlossaryMatch]]:
+        """Annotate each of many texts with non-overlapping glossary terms."""
+        return [self.annotate(text) for text in texts]
+
+
+# Number of lay glossary rows written through the ORM by this process. Part of the glossary fingerprint because
+# last_updated only has one second resolution on SQLite.
+_glossary_writes = 0
+
+
+@event.listens_for(LayGlossary, "after_insert")
+@event.listens_for(LayGlossary, "after_update")
+@event.listens_for(LayGlossary, "after_delete")
+def _count_glossary_write(mapper, connection, target):
+    global _glossary_writes
+    _glossary_writes += 1
+
+
+class GlossaryMatcherCache:
+    """Keep a compiled GlossaryMatcher and rebuild it only when the lay glossary table has changed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._matcher = None
+
+    @staticmethod
+    def _glossary_version(db_session):
+        """Cheap fingerprint of the lay glossary: row count, highest ID, latest update time and local write count."""
+        return tuple(db_session.query(
+            func.count(LayGlossary.id),
+            func.max(LayGlossary.id),
+            func.max(LayGlossary.last_updated),
+        ).one()) + (_glossary_writes,)
+
+    def get(self, db_session) -> GlossaryMatcher:
+        """Return the matcher for the current glossary, compiling it if the glossary changed since the last call."""
+        version = self._glossary_version(db_session)
+        with self._lock:
+            if self._matcher is None or version != self._version:
+                rows = db_session.query(LayGlossary.term, LayGlossary.definition).order_by(LayGlossary.id).all()
+                self._matcher = GlossaryMatcher(rows)
+                self._version = version
+            return self._matcher
+
+    def invalidate(self):
+        """Force the next call to get() to rebuild the matcher."""
+        with self._lock:
+            self._matcher = None
+            self._version = None
+
+
+glossary_matcher_cache = GlossaryMatcherCache()
+
+
+def get_glossary_matcher(db_session) -> GlossaryMatcher:
+    """Fetch the compiled glossary matcher, rebuilding it only when the lay glossary has changed."""
+    return glossary_matcher_cache.get(db_session)
+
+
+def annotate_text(db_session, text: str) -> t.List[GlossaryMatch]:
+    """Annotate a text, such as an LPS section, with the lay glossary terms it contains."""
+    return get_glossary_matcher(db_session).annotate(text)
+
+
+def annotate_texts(db_session, texts: t.Iterable[str]) -> t.List[t.List[GlossaryMatch]]:
+    """Annotate many texts with the lay glossary terms they contain, compiling the glossary at most once."""
+    return get_glossary_matcher(db_session).annotate_many(texts)
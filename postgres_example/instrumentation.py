@@ -0,0 +1,262 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from pydantic import BaseModel
+from collections import deque
+from datetime import datetime, timezone
+import typing as t
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+import os
+
+
+# Upper bounds of the histogram buckets. The last bucket counts everything above the highest bound.
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+slow_query_logger = logging.getLogger("postgres_example.slow_query")
+
+
+class Histogram(BaseModel):
+    """Pydantic model for a histogram: counts[i] observations were <= bounds[i], and counts[-1] above every bound."""
+    bounds: t.List[float]
+    counts: t.List[int]
+
+    @classmethod
+    def empty(cls, bounds: t.Sequence[float]) -> "Histogram":
+        return cls(bounds=list(bounds), counts=[0] * (len(bounds) + 1))
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+
+class FunctionStats(BaseModel):
+    """Pydantic model for the calls, statements, database time and rows of one instrumented function."""
+    calls: int = 0
+    errors: int = 0
+    statements: int = 0
+    db_time_ms: float = 0.0
+    total_time_ms: float = 0.0
+    rows_returned: int = 0
+    rows_affected: int = 0
+    duration_ms: Histogram = Histogram.empty(DURATION_BUCKETS_MS)
+    db_time_ms_per_call: Histogram = Histogram.empty(DURATION_BUCKETS_MS)
+    statements_per_call: Histogram = Histogram.empty(STATEMENT_BUCKETS)
+
+
+class SlowQuery(BaseModel):
+    """Pydantic model for a statement that ran longer than the slow query threshold, without its parameter values."""
+    function: t.Optional[str]
+    statement: str
+    parameters: t.Any
+    duration_ms: float
+    executed_at: datetime
+
+
+class _Call:
+    """Statements, database time and affected rows of one call to an instrumented function."""
+    __slots__ = ("function", "statements", "db_time", "rows_affected")
+
+    def __init__(self, function: str):
+        self.function = function
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows_affected = 0
+
+
+class _Instrumentation:
+    """Per-function statistics and the slow query log, filled in by engine events while enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = 100.0
+        self.lock = threading.Lock()
+        self.stats: t.Dict[str, FunctionStats] = {}
+        self.slow_queries: t.Deque[SlowQuery] = deque(maxlen=1000)
+
+
+_state = _Instrumentation()
+_current_call: contextvars.ContextVar[t.Optional[_Call]] = contextvars.ContextVar("current_call", default=None)
+
+
+def _redact(parameters):
+    """Replace bound parameter values with their type names, keeping the shape of the parameters."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return {"executemany": len(parameters), "first": _redact(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("instrumentation_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Statements that started before instrumentation was enabled have no start time
+    starts = conn.info.get("instrumentation_start")
+    if not starts:
+        return
+    started = starts.pop()
+    elapsed = time.perf_counter() - started
+    call = _current_call.get()
+    if call is not None:
+        call.statements += 1
+        call.db_time += elapsed
+        if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+            call.rows_affected += max(cursor.rowcount, 0)
+    if elapsed * 1000 >= _state.slow_query_ms:
+        slow_query = SlowQuery(
+            function=call.function if call else None,
+            statement=statement,
+            parameters=_redact(parameters),
+            duration_ms=elapsed * 1000,
+            executed_at=datetime.now(timezone.utc),
+        )
+        _state.slow_queries.append(slow_query)
+        slow_query_logger.warning(
+            "Slow query in %s took %.1f ms: %s parameters=%s",
+            slow_query.function, slow_query.duration_ms, statement, slow_query.parameters,
+        )
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute, so drop its start time
+    if context.connection is not None:
+        starts = context.connection.info.get("instrumentation_start")
+        if starts:
+            starts.pop()
+
+
+def enable_instrumentation(slow_query_ms: float = 100.0):
+    """Start recording statements on every engine, and log statements slower than slow_query_ms."""
+    _state.slow_query_ms = slow_query_ms
+    if not _state.enabled:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+        _state.enabled = True
+
+
+def disable_instrumentation():
+    """Stop recording statements. The statistics gathered so far are kept until reset_stats()."""
+    if _state.enabled:
+        event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.remove(Engine, "handle_error", _handle_error)
+        _state.enabled = False
+
+
+def reset_stats():
+    """Clear the per-function statistics and the slow query log."""
+    with _state.lock:
+        _state.stats.clear()
+        _state.slow_queries.clear()
+
+
+def get_stats() -> t.Dict[str, FunctionStats]:
+    """Copy of the statistics of every instrumented function called while instrumentation was enabled."""
+    with _state.lock:
+        return {name: stats.model_copy(deep=True) for name, stats in _state.stats.items()}
+
+
+def get_slow_queries() -> t.List[SlowQuery]:
+    """The most recent slow queries, oldest first."""
+    return list(_state.slow_queries)
+
+
+def _rows_returned(result) -> int:
+    """Number of rows a CRUD function handed back: the length of a list, or one for a single instance."""
+    if result is None or isinstance(result, bool):
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, int):
+        return 0
+    return 1
+
+
+def _record(call: _Call, elapsed: float, rows_returned: int, failed: bool):
+    duration_ms = elapsed * 1000
+    db_time_ms = call.db_time * 1000
+    with _state.lock:
+        stats = _state.stats.setdefault(call.function, FunctionStats())
+        stats.calls += 1
+        stats.errors += failed
+        stats.statements += call.statements
+        stats.db_time_ms += db_time_ms
+        stats.total_time_ms += duration_ms
+        stats.rows_returned += rows_returned
+        stats.rows_affected += call.rows_affected
+        stats.duration_ms.observe(duration_ms)
+        stats.db_time_ms_per_call.observe(db_time_ms)
+        stats.statements_per_call.observe(call.statements)
+
+
+def _instrument_iterator(call: _Call, iterator: t.Iterator):
+    """Attribute the statements run while a returned generator is consumed to the function that returned it."""
+    started = time.perf_counter()
+    rows = 0
+    failed = False
+    try:
+        while True:
+            token = _current_call.set(call)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_call.reset(token)
+            rows += 1
+            yield item
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _record(call, time.perf_counter() - started, rows, failed)
+
+
+def instrumented(function):
+    """
+    Record the statements, database time and rows of each call to a CRUD function while instrumentation is
+    enabled. Calls made from inside another instrumented function are counted towards the outer one.
+    """
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _state.enabled or _current_call.get() is not None:
+            return function(*args, **kwargs)
+        call = _Call(name)
+        token = _current_call.set(call)
+        started = time.perf_counter()
+        failed = False
+        result = None
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            _current_call.reset(token)
+            if not inspect.isgenerator(result):
+                _record(call, time.perf_counter() - started, _rows_returned(result), failed)
+        if inspect.isgenerator(result):
+            return _instrument_iterator(call, result)
+        return result
+
+    return wrapper
+
+
+# Opt in from the environment, for services that cannot call enable_instrumentation themselves
+if os.getenv("DB_INSTRUMENTATION", "").strip().lower() in ("1", "true", "yes"):
+    enable_instrumentation(float(os.getenv("DB_SLOW_QUERY_MS", "100")))